@@ -0,0 +1,5 @@
+"""
+Benchmarks of genepy, printing one JSON record per measure:
+
+    python -m benchmarks [--full] [--output results.jsonl] [names...]
+"""
@@ -0,0 +1,58 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from .suite import BENCHMARKS, SIZES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def environment():
+    """
+    Returns the record describing the machine and the versions used.
+    """
+    return {
+        'benchmark':    'environment',
+        'time':         time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python':       platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform':     platform.platform(),
+        'processor':    platform.processor(),
+        'numpy':        np.__version__ if np is not None else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                    description='Runs the genepy benchmarks and '
+                                    'prints one JSON record per line.')
+    parser.add_argument('names', nargs='*',
+                        help='benchmarks to run (all by default): %s' %
+                        ', '.join(sorted(BENCHMARKS)))
+    parser.add_argument('--full', action='store_true',
+                        help='use the full sizes instead of the quick ones')
+    parser.add_argument('--output', help='file to append the records to')
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if not name in BENCHMARKS:
+            parser.error('unknown benchmark: %s' % name)
+    sizes = SIZES['full' if args.full else 'quick']
+    output = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        output.write(json.dumps(environment()) + '\n')
+        for name in args.names or sorted(BENCHMARKS):
+            for record in BENCHMARKS[name](sizes):
+                record['sizes'] = 'full' if args.full else 'quick'
+                output.write(json.dumps(record) + '\n')
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
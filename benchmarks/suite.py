@@ -0,0 +1,274 @@
+import copy
+import random
+from timeit import default_timer
+from genepy.core import EvolutionaryAlgorithm
+from genepy.tree import Tree, to_columns
+from genepy.functions import add, sub, mul, div
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+FUNCTIONS = [add, sub, mul, div]
+
+"""
+Sizes used by each benchmark, in quick mode and in full mode.
+"""
+SIZES = {
+    'quick': {
+        'depths':           [4, 6],
+        'populations':      [50, 200],
+        'samples':          [100, 1000],
+        'fit_populations':  [50],
+        'fit_samples':      [100],
+        'iterations':       5,
+        'repeat':           3,
+    },
+    'full': {
+        'depths':           [4, 6, 8],
+        'populations':      [100, 500, 2000],
+        'samples':          [1000, 10000],
+        'fit_populations':  [100, 500],
+        'fit_samples':      [1000, 5000],
+        'iterations':       20,
+        'repeat':           5,
+    },
+}
+
+
+def make_problem(name, n_samples, seed=0):
+    """
+    Returns the features and targets of a synthetic regression problem.
+    :param name:        'polynomial' (2 features) or 'linear' (5 features)
+    :param n_samples:   Number of examples
+    :param seed:        Seed of the generated data
+    """
+    rng = random.Random(seed)
+    if name == 'polynomial':
+        features = [[rng.uniform(-5, 5) for _ in range(2)]
+                    for _ in range(n_samples)]
+        targets = [x[0] * x[0] + x[0] * x[1] - 3 for x in features]
+    elif name == 'linear':
+        features = [[rng.uniform(-5, 5) for _ in range(5)]
+                    for _ in range(n_samples)]
+        targets = [2 * x[0] - x[1] + 3 * x[2] - x[4] + 7 for x in features]
+    else:
+        raise AttributeError('Problem must be either polynomial or linear')
+    return features, targets
+
+
+def mean_absolute_error(tree, features, targets):
+    return -sum(abs(tree.predict(x) - y)
+                for x, y in zip(features, targets)) / len(targets)
+
+
+def vectorized_mean_absolute_error(tree, predictions, targets):
+    return -float(np.mean(np.abs(predictions - targets)))
+
+
+def random_trees(n_trees, depth, n_variables, seed=0):
+    """
+    Returns randomly built trees, half with the grow method and half with the
+    full method.
+    :param n_trees:     Number of trees
+    :param depth:       Maximum depth of the trees
+    :param n_variables: Number of variables of the trees
+    :param seed:        Seed of the random generator
+    """
+    random.seed(seed)
+    variables = [str(i) for i in range(n_variables)]
+    return [Tree(depth, 20, 0.7, 0.6, FUNCTIONS, variables,
+                'grow' if i % 2 == 0 else 'full') for i in range(n_trees)]
+
+
+def measure(function, repeat, setup=None):
+    """
+    Calls a function repeat times and returns the shortest and mean durations
+    in seconds.
+    :param function:    The function to time, called without arguments
+    :param repeat:      Number of calls
+    :param setup:       If set, function called before each call without being
+                        timed; its result is then passed to function
+    """
+    durations = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = default_timer()
+        function(*args)
+        durations.append(default_timer() - start)
+    return min(durations), sum(durations) / len(durations)
+
+
+def result(benchmark, params, durations, operations, unit):
+    """
+    Returns the record of a benchmark.
+    :param benchmark:   The name of the benchmark
+    :param params:      The parameters of the run
+    :param durations:   The (shortest, mean) durations returned by measure
+    :param operations:  Number of operations done by each call
+    :param unit:        What the operations are
+    """
+    return {
+        'benchmark':    benchmark,
+        'params':       params,
+        'best_s':       durations[0],
+        'mean_s':       durations[1],
+        'operations':   operations,
+        'unit':         unit,
+        'per_second':   operations / durations[0] if durations[0] > 0 else None,
+    }
+
+
+def bench_construction(sizes):
+    """
+    Builds trees with the grow and full methods.
+    :param sizes:   The sizes of the benchmark (see SIZES)
+    """
+    variables = ['0', '1']
+    n_trees = 200
+    for method in ['grow', 'full']:
+        for depth in sizes['depths']:
+            random.seed(0)
+            nodes = sum(len(Tree(depth, 20, 0.7, 0.6, FUNCTIONS, variables,
+                                method)) for _ in range(n_trees))
+            durations = measure(lambda: [Tree(depth, 20, 0.7, 0.6, FUNCTIONS,
+                                            variables, method)
+                                        for _ in range(n_trees)],
+                                sizes['repeat'])
+            yield result('construction', {'method': method, 'depth': depth,
+                                        'trees': n_trees},
+                        durations, nodes, 'nodes')
+
+
+def bench_predict(sizes):
+    """
+    Evaluates trees example by example (Tree.predict) and, with NumPy,
+    on feature columns (Tree.predict_columns).
+    :param sizes:   The sizes of the benchmark (see SIZES)
+    """
+    for depth in sizes['depths']:
+        trees = random_trees(20, depth, 2)
+        nodes = sum(len(tree) for tree in trees)
+        for n_samples in sizes['samples']:
+            features, targets = make_problem('polynomial', n_samples)
+            for tree in trees:
+                tree.compile()
+            durations = measure(lambda: [tree.predict(x) for tree in trees
+                                        for x in features], sizes['repeat'])
+            yield result('predict', {'depth': depth, 'samples': n_samples},
+                        durations, nodes * n_samples, 'nodes')
+            if np is None:
+                continue
+            columns = to_columns(features)
+            durations = measure(lambda: [tree.predict_columns(columns)
+                                        for tree in trees], sizes['repeat'])
+            yield result('predict_columns', {'depth': depth,
+                                            'samples': n_samples},
+                        durations, nodes * n_samples, 'nodes')
+
+
+def bench_selection(sizes):
+    """
+    Selects a population with each selection method.
+    :param sizes:   The sizes of the benchmark (see SIZES)
+    """
+    for population in sizes['populations']:
+        for method in ['mixed', 'roulette', 'rank', 'tournament']:
+            ea = EvolutionaryAlgorithm(FUNCTIONS, mean_absolute_error,
+                                        nb_trees=population,
+                                        selection_method=method)
+            trees = random_trees(population, 5, 2)
+            rng = random.Random(0)
+            fitness = [-rng.uniform(0, 100) for _ in trees]
+            durations = measure(lambda: ea.selection(trees, fitness),
+                                sizes['repeat'])
+            yield result('selection', {'method': method,
+                                        'population': population},
+                        durations, population, 'individuals')
+
+
+def bench_variation(sizes):
+    """
+    Applies the variation operators to a selected population.
+    :param sizes:   The sizes of the benchmark (see SIZES)
+    """
+    for population in sizes['populations']:
+        for backend in ['tree', 'linear']:
+            ea = EvolutionaryAlgorithm(FUNCTIONS, mean_absolute_error,
+                                        nb_trees=population, backend=backend,
+                                        seed=0)
+            random.seed(0)
+            variables = ['0', '1']
+            trees = ea.create_trees(variables)
+            fitness = [-random.uniform(0, 100) for _ in trees]
+            durations = measure(lambda parents: ea.generate_next_population(
+                                    parents, variables),
+                                sizes['repeat'],
+                                lambda: ea.selection(copy.deepcopy(trees),
+                                                    fitness))
+            yield result('generate_next_population',
+                        {'backend': backend, 'population': population},
+                        durations, population, 'individuals')
+
+
+def bench_deepcopy(sizes):
+    """
+    Deep copies a population.
+    :param sizes:   The sizes of the benchmark (see SIZES)
+    """
+    for population in sizes['populations']:
+        for depth in sizes['depths']:
+            trees = random_trees(population, depth, 2)
+            nodes = sum(len(tree) for tree in trees)
+            durations = measure(lambda: copy.deepcopy(trees), sizes['repeat'])
+            yield result('deepcopy', {'depth': depth,
+                                    'population': population},
+                        durations, nodes, 'nodes')
+
+
+def bench_fit(sizes):
+    """
+    Trains on synthetic regression problems.
+    :param sizes:   The sizes of the benchmark (see SIZES)
+    """
+    configurations = [{'vectorized': False}]
+    if np is not None:
+        configurations.append({'vectorized': True})
+    for problem in ['polynomial', 'linear']:
+        for n_samples in sizes['fit_samples']:
+            features, targets = make_problem(problem, n_samples)
+            for population in sizes['fit_populations']:
+                for configuration in configurations:
+                    if configuration['vectorized']:
+                        fitness = vectorized_mean_absolute_error
+                    else:
+                        fitness = mean_absolute_error
+                    iterations = sizes['iterations']
+                    durations = measure(lambda ea: ea.fit(features, targets,
+                                                        iterations),
+                                        sizes['repeat'],
+                                        lambda: EvolutionaryAlgorithm(
+                                            FUNCTIONS, fitness,
+                                            nb_trees=population, seed=0,
+                                            **configuration))
+                    params = {'problem': problem, 'samples': n_samples,
+                            'population': population,
+                            'iterations': iterations}
+                    params.update(configuration)
+                    yield result('fit', params, durations,
+                                population * iterations, 'evaluations')
+
+
+"""
+Available benchmarks, by name.
+"""
+BENCHMARKS = {
+    'construction':             bench_construction,
+    'predict':                  bench_predict,
+    'selection':                bench_selection,
+    'generate_next_population': bench_variation,
+    'deepcopy':                 bench_deepcopy,
+    'fit':                      bench_fit,
+}
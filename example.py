@@ -4,15 +4,7 @@ import numpy as np
 from functools import reduce
 import matplotlib.pyplot as plt
 from genepy.core import EvolutionaryAlgorithm
-
-
-"""
-Functions that can be used in the trees.
-"""
-def add(a, b): return a + b
-def sub(a, b): return a - b
-def mul(a, b): return a * b
-def div(a, b): return a / b if b != 0 else 1
+from genepy.functions import add, sub, mul, div
 
 
 def compute_fitness(tree, features, data):
@@ -23,7 +15,18 @@ def compute_fitness(tree, features, data):
     difference = [abs(predicted[i] - data[i]) for i in range(len(data))]
     mae = reduce(lambda a,b: a+b, difference) / len(data)
     fitness = 1 / mae if mae != 0 else 1.0
-    fitness /= len(tree.nodes)
+    fitness /= len(tree)
+    return fitness
+
+
+def compute_batch_fitness(tree, predicted, data):
+    """
+    Same as compute_fitness, but receives the predictions of the tree on the
+    whole training set (used when the algorithm is vectorized).
+    """
+    mae = np.mean(np.abs(predicted - data))
+    fitness = 1 / mae if mae != 0 else 1.0
+    fitness /= len(tree)
     return fitness
 
 
@@ -36,13 +39,13 @@ def train_test(meta):
     features = [[x] for x in range(-100,100)]
     targets = [x**3 for x in range(-100,100)]
     functions = [add, sub, mul, div]
-    ea = EvolutionaryAlgorithm(**meta, fitness_function=compute_fitness,
-                                functions=functions)
+    ea = EvolutionaryAlgorithm(**meta, fitness_function=compute_batch_fitness,
+                                functions=functions, vectorized=True)
     ea.fit(features, targets, meta['iterations'])
     print(ea.tree)
 
     x = np.arange(-10,10,0.1)
-    predicted = [ea.predict([f]) for f in x]
+    predicted = ea.predict_batch(x.reshape(-1, 1))
     real = [f**3 for f in x]
     plt.plot(x, real, label='Real')
     plt.plot(x, predicted, label='Predicted')
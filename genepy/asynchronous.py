@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+
+def evaluate_concurrently(fitness, inputs, targets, concurrency=10, timeout=None):
+    """
+    Computes the fitness of trees with a coroutine fitness function, running
+    up to concurrency evaluations at the same time on an asyncio event loop.
+    Returns the fitness of each tree, in the order of the inputs, None for the
+    evaluations that did not finish within timeout seconds.
+    :param fitness:     The coroutine function computing the fitness of a tree,
+                        called as fitness(tree, features, targets)
+    :param inputs:      Iterable of (tree, features) pairs. It is consumed as
+                        the evaluations start, so at most concurrency
+                        features (for example predictions) are used at a time
+    :param targets:     Target values
+    :param concurrency: Maximum number of evaluations running at the same time
+    :param timeout:     If set, maximum number of seconds of each evaluation
+    """
+    coroutine = _evaluate_all(fitness, inputs, targets, concurrency, timeout)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Called from a running event loop (a notebook for example), which cannot
+    # be blocked: the evaluations run on a new loop in another thread
+    results = []
+    thread = threading.Thread(target=lambda: results.append(
+                                asyncio.run(coroutine)))
+    thread.start()
+    thread.join()
+    if not results:
+        raise RuntimeError('Asynchronous evaluation failed')
+    return results[0]
+
+
+async def _evaluate_all(fitness, inputs, targets, concurrency, timeout):
+    results = {}
+    pending = enumerate(inputs)
+
+    async def worker():
+        for index, (tree, features) in pending:
+            try:
+                results[index] = await asyncio.wait_for(
+                                    fitness(tree, features, targets), timeout)
+            except asyncio.TimeoutError:
+                results[index] = None
+
+    await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+    return [results[index] for index in range(len(results))]
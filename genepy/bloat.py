@@ -0,0 +1,81 @@
+SIZE_CONTROLS = [None, 'equalisation']
+
+
+class SizeEqualizer(object):
+    """
+    Operator equalisation: controls the distribution of the sizes of the trees
+    instead of their maximum size. The sizes are grouped in bins of bin_width
+    sizes, and each bin receives a number of offspring proportional to the mean
+    fitness of its trees in the current population. Offspring larger than the
+    largest trees of the current population are only accepted when they are
+    fitter than the best tree seen, and then open a new bin (dynamic operator
+    equalisation), so the sizes only grow when larger trees are fitter.
+    :param bin_width:   Number of different sizes grouped in each bin
+    """
+
+    def __init__(self, bin_width=5):
+        if bin_width < 1:
+            raise AttributeError('Bin width must be at least 1')
+        self.bin_width = bin_width
+        self.capacities = None
+        self.best = None
+
+
+    def bin(self, tree):
+        """
+        Returns the index of the bin of a tree.
+        :param tree:    The tree
+        """
+        return (len(tree) - 1) // self.bin_width
+
+
+    def update(self, trees, fitness):
+        """
+        Computes the number of offspring accepted in each bin from the fitness
+        of the current population. Bins without trees smaller than the largest
+        trees accept one offspring.
+        :param trees:   The current population
+        :param fitness: The fitness of the current population
+        """
+        bins = {}
+        for tree, fit in zip(trees, fitness):
+            bins.setdefault(self.bin(tree), []).append(fit)
+        lowest = min(fitness)
+        if self.best is None or max(fitness) > self.best:
+            self.best = max(fitness)
+        weights = dict((index, sum(values) / len(values) - lowest)
+                        for index, values in bins.items())
+        total = sum(weights.values())
+        if not total > 0:
+            weights = dict((index, len(values)) for index, values in bins.items())
+            total = len(trees)
+        self.capacities = [max(1, int(round(len(trees) * weights[index] / total)))
+                            if index in weights else 1
+                            for index in range(max(bins) + 1)]
+
+
+    def accept(self, tree, evaluate=None):
+        """
+        Returns True if there is room for a tree in its bin, and records it. A
+        tree larger than the bins is accepted if it is fitter than the best
+        tree seen; the bins up to its own are then opened.
+        :param tree:        The offspring
+        :param evaluate:    Function returning the fitness of a tree. If None,
+                            the trees larger than the bins are rejected
+        """
+        if self.capacities is None:
+            return True
+        index = self.bin(tree)
+        if index >= len(self.capacities):
+            if evaluate is None:
+                return False
+            fit = evaluate(tree)
+            if not fit > self.best:
+                return False
+            self.best = fit
+            self.capacities.extend([1] * (index - len(self.capacities)) + [0])
+            return True
+        if self.capacities[index] <= 0:
+            return False
+        self.capacities[index] -= 1
+        return True
@@ -0,0 +1,60 @@
+from collections import OrderedDict
+
+
+class FitnessCache(object):
+    """
+    Bounded cache of fitness values, keyed by the structural key of the trees
+    (see Tree.structural_key). The least recently used entries are discarded
+    first when the cache is full.
+    :param max_size:    Maximum number of fitness values kept in the cache
+    """
+
+    def __init__(self, max_size):
+        if max_size <= 0:
+            raise AttributeError('Cache size must be positive')
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key):
+        """
+        Returns the fitness stored for a key, or None if it is not cached.
+        :param key: The structural key of a tree
+        """
+        try:
+            value = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+
+    def put(self, key, value):
+        """
+        Stores the fitness of a tree.
+        :param key:     The structural key of the tree
+        :param value:   The fitness of the tree
+        """
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+    def clear(self, reset_counters=True):
+        """
+        Removes all the entries of the cache.
+        :param reset_counters:  If True, also resets the hit and miss counters
+        """
+        self.entries.clear()
+        if reset_counters:
+            self.hits = 0
+            self.misses = 0
+
+
+    def __len__(self):
+        return len(self.entries)
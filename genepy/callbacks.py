@@ -0,0 +1,188 @@
+import json
+import math
+from timeit import default_timer
+
+
+def generation_stats(generation, fitness, sizes, timings):
+    """
+    Returns the statistics of a generation passed to Callback.on_generation.
+    :param generation:  The index of the generation
+    :param fitness:     The fitness of the individuals of the generation
+    :param sizes:       The number of nodes of the individuals
+    :param timings:     The seconds spent in each step of the generation, by
+                        name of the step
+    """
+    mean = sum(fitness) / len(fitness)
+    stats = {
+        'generation':       generation,
+        'best_fitness':     max(fitness),
+        'mean_fitness':     mean,
+        'worst_fitness':    min(fitness),
+        'std_fitness':      math.sqrt(sum((fit - mean) ** 2 for fit in fitness)
+                                    / len(fitness)),
+        'best_size':        sizes[fitness.index(max(fitness))],
+        'mean_size':        sum(sizes) / len(sizes),
+        'max_size':         max(sizes),
+        'min_size':         min(sizes),
+    }
+    for step, seconds in timings.items():
+        stats['time_' + step] = seconds
+    return stats
+
+
+class Callback(object):
+    """
+    Base class of the objects observing a training run (see
+    EvolutionaryAlgorithm.fit). The methods do nothing by default.
+    """
+
+    def on_fit_start(self, ea):
+        """
+        Called before the creation of the first generation.
+        :param ea:  The EvolutionaryAlgorithm being trained
+        """
+        pass
+
+
+    def on_generation(self, ea, stats):
+        """
+        Called after each generation has been evaluated, selected and varied.
+        Returning True stops the training.
+        :param ea:      The EvolutionaryAlgorithm being trained
+        :param stats:   The statistics of the generation (see generation_stats):
+                        generation, best_fitness, mean_fitness, worst_fitness,
+                        std_fitness, best_size, mean_size, max_size, min_size,
+                        evaluations (number of fitness computations so far),
+                        and time_evaluation, time_selection, time_variation in
+                        seconds. Also holds the fitness cache counters, the
+                        sample size and the number of timed out asynchronous
+                        evaluations when they are used
+        """
+        pass
+
+
+    def on_fit_end(self, ea):
+        """
+        Called once the final tree has been chosen (ea.tree).
+        :param ea:  The EvolutionaryAlgorithm being trained
+        """
+        pass
+
+
+class Profiler(Callback):
+    """
+    Records the statistics of each generation, and optionally writes them to a
+    file as JSON lines while training.
+    :param path:    If set, path of the file the statistics are appended to,
+                    one JSON object per generation
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.records = []
+        self.file = None
+        self.start = None
+
+
+    def on_fit_start(self, ea):
+        self.records = []
+        self.start = default_timer()
+        if self.path is not None:
+            self.file = open(self.path, 'a')
+
+
+    def on_generation(self, ea, stats):
+        record = dict(stats)
+        record['time_elapsed'] = default_timer() - self.start
+        self.records.append(record)
+        if self.file is not None:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+
+
+    def on_fit_end(self, ea):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+    def dump(self, output):
+        """
+        Writes the recorded statistics as JSON lines.
+        :param output:  A path or a file object
+        """
+        if isinstance(output, str):
+            with open(output, 'w') as fd:
+                self.dump(fd)
+            return
+        for record in self.records:
+            output.write(json.dumps(record) + '\n')
+
+
+    def summary(self):
+        """
+        Returns the total number of seconds spent in each step of the recorded
+        generations, and the share of each step in the total.
+        """
+        totals = {}
+        for record in self.records:
+            for key, value in record.items():
+                if key.startswith('time_') and key != 'time_elapsed':
+                    totals[key[5:]] = totals.get(key[5:], 0.0) + value
+        total = sum(totals.values())
+        summary = {'generations': len(self.records), 'seconds': total}
+        for step, seconds in totals.items():
+            summary[step + '_seconds'] = seconds
+            summary[step + '_share'] = seconds / total if total > 0 else 0.0
+        return summary
+
+
+class EarlyStopping(Callback):
+    """
+    Stops the training when one of the given criteria is met. The criteria
+    are checked after each generation. The name of the criterion that stopped
+    the last training is kept in self.reason.
+    :param target_fitness:  Stops when the best fitness of a generation reaches
+                            this value
+    :param patience:        Stops when the best fitness has not improved for
+                            this number of generations
+    :param time_budget:     Stops when the training has lasted this number of
+                            seconds
+    :param max_evaluations: Stops when the fitness function has been computed
+                            this number of times
+    """
+
+    def __init__(self, target_fitness=None, patience=None, time_budget=None,
+                max_evaluations=None):
+        self.target_fitness = target_fitness
+        self.patience = patience
+        self.time_budget = time_budget
+        self.max_evaluations = max_evaluations
+        self.reason = None
+
+
+    def on_fit_start(self, ea):
+        self.start = default_timer()
+        self.best = None
+        self.stagnation = 0
+        self.reason = None
+
+
+    def on_generation(self, ea, stats):
+        best = stats['best_fitness']
+        if self.best is None or best > self.best:
+            self.best = best
+            self.stagnation = 0
+        else:
+            self.stagnation += 1
+        if self.target_fitness is not None and best >= self.target_fitness:
+            self.reason = 'target_fitness'
+        elif self.patience is not None and self.stagnation >= self.patience:
+            self.reason = 'patience'
+        elif self.time_budget is not None and \
+            default_timer() - self.start >= self.time_budget:
+            self.reason = 'time_budget'
+        elif self.max_evaluations is not None and \
+            stats['evaluations'] >= self.max_evaluations:
+            self.reason = 'max_evaluations'
+        return self.reason is not None
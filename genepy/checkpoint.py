@@ -0,0 +1,291 @@
+import base64
+import importlib
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from .tree import Tree, NodeSet
+from .linear import LinearTree, VARIABLE, CONSTANT, array_bytes
+
+
+"""
+Binary format of the files written by this module (little-endian):
+    - magic bytes b'GNPY' and format version (uint16)
+    - length (uint32) and content of a JSON header, holding the names of the
+      functions of the function table and the metadata of the file
+    - the sections of trees listed in the header (see write_trees), each made
+      of the number of trees (uint32), the length of the compressed data
+      (uint32), the number of nodes of each tree (uint32) and the compressed
+      data: the opcodes (int16) then the operands (float64) of all the trees
+      in prefix order (see LinearTree) and, if the header has node_order set,
+      the node orders of the Trees (uint32, see node_order)
+"""
+MAGIC = b'GNPY'
+VERSION = 1
+
+
+def function_name(function):
+    """
+    Returns the name under which a function is stored: 'module:qualified name'.
+    :param function:    The function
+    """
+    return '{}:{}'.format(function.__module__,
+                        getattr(function, '__qualname__', function.__name__))
+
+
+def import_function(name):
+    """
+    Returns the function stored under a name (see function_name).
+    :param name:    The name of the function
+    """
+    module, qualname = name.split(':')
+    function = importlib.import_module(module)
+    for attribute in qualname.split('.'):
+        if attribute == '<lambda>' or attribute == '<locals>':
+            raise AttributeError('Cannot import %s, the functions must be given'
+                                % name)
+        function = getattr(function, attribute)
+    return function
+
+
+def resolve_functions(names, functions=None):
+    """
+    Returns the function table stored under the given names.
+    :param names:       The names of the functions of the table
+    :param functions:   If set, the functions to use, matched by name; otherwise
+                        the functions are imported
+    """
+    if functions is None:
+        return [import_function(name) for name in names]
+    provided = [function_name(function) for function in functions]
+    if provided == names:
+        return functions
+    table = dict(zip(provided, functions))
+    if len(table) != len(provided) or any(not name in table for name in names):
+        raise AttributeError('The functions do not match the function table '
+                            'of the file')
+    return [table[name] for name in names]
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def _prefix_nodes(tree):
+    nodes = []
+    stack = [tree.root_node]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        if node.next_left is not None:
+            stack.append(node.next_right)
+            stack.append(node.next_left)
+    return nodes
+
+
+def node_order(tree, nodes=None):
+    """
+    Returns the prefix indexes of the nodes of a Tree, in the order of its node
+    sets (function nodes first). The nodes picked by the variation operators
+    depend on this order.
+    :param tree:    The Tree
+    :param nodes:   The nodes of the tree in prefix order, if already known
+    """
+    if nodes is None:
+        nodes = _prefix_nodes(tree)
+    indexes = dict((node, i) for i, node in enumerate(nodes))
+    return [indexes[node] for node in tree.function_nodes] + \
+            [indexes[node] for node in tree.value_nodes]
+
+
+def restore_node_order(tree, order):
+    """
+    Reorders the node sets of a Tree built from its prefix (see node_order).
+    :param tree:    The Tree
+    :param order:   The prefix indexes returned by node_order
+    """
+    nodes = _prefix_nodes(tree)
+    tree.function_nodes = NodeSet()
+    tree.value_nodes = NodeSet()
+    for index in order:
+        tree.register_node(nodes[index])
+
+
+def write_trees(fd, trees, functions, ordered=False):
+    """
+    Writes a section of trees: the number of trees and their sizes, followed
+    by the opcodes, the operands and, if ordered, the node orders of all the
+    trees, compressed with zlib.
+    :param fd:          The binary file
+    :param trees:       The trees (Tree or LinearTree)
+    :param functions:   The function table used to encode the functions
+    :param ordered:     If True, the trees are Trees whose node order is saved
+    """
+    opcodes = array('h')
+    operands = array('d')
+    orders = array('I')
+    sizes = array('I')
+    codes = dict((function, i) for i, function in enumerate(functions))
+    for tree in trees:
+        if isinstance(tree, LinearTree) and tree.functions == functions:
+            opcodes.extend(tree.opcodes)
+            operands.extend(tree.operands)
+            sizes.append(len(tree))
+            continue
+        nodes = _prefix_nodes(tree.to_tree() if isinstance(tree, LinearTree)
+                                else tree)
+        values = [node.value for node in nodes]
+        opcodes.fromlist([codes[value] if hasattr(value, '__call__') else
+                        VARIABLE if isinstance(value, str) else CONSTANT
+                        for value in values])
+        operands.fromlist([0.0 if hasattr(value, '__call__') else
+                        float(value) for value in values])
+        if ordered:
+            orders.fromlist(node_order(tree, nodes))
+        sizes.append(len(nodes))
+    data = b''.join(array_bytes(_little_endian(values))
+                    for values in (opcodes, operands, orders))
+    data = zlib.compress(data)
+    fd.write(struct.pack('<II', len(sizes), len(data)))
+    fd.write(array_bytes(_little_endian(sizes)))
+    fd.write(data)
+
+
+def read_trees(fd, functions, tree_class=Tree, ordered=False):
+    """
+    Reads a section of trees written by write_trees.
+    :param fd:          The binary file
+    :param functions:   The function table of the file
+    :param tree_class:  The class of the trees to build (Tree or LinearTree)
+    :param ordered:     True if the node order of the trees was saved
+    """
+    count, length = struct.unpack('<II', fd.read(8))
+    sizes = _little_endian(array('I', fd.read(4 * count)))
+    data = zlib.decompress(fd.read(length))
+    total = sum(sizes)
+    opcodes = _little_endian(array('h', data[:2 * total]))
+    operands = _little_endian(array('d', data[2 * total:10 * total]))
+    orders = None
+    if ordered:
+        orders = _little_endian(array('I', data[10 * total:14 * total]))
+    trees = []
+    start = 0
+    for size in sizes:
+        end = start + size
+        tree = LinearTree.from_arrays(opcodes[start:end], operands[start:end],
+                                    functions)
+        if tree_class is not LinearTree:
+            tree = tree.to_tree()
+            if orders is not None:
+                restore_node_order(tree, orders[start:end])
+        trees.append(tree)
+        start = end
+    return trees
+
+
+def write_file(path, header, sections, functions):
+    """
+    Writes a file atomically: the data is written to a temporary file which
+    then replaces the file, so an interrupted write keeps the previous file.
+    :param path:        The path of the file
+    :param header:      The metadata stored in the JSON header
+    :param sections:    The sections of trees, by name
+    :param functions:   The function table of the trees
+    """
+    ordered = all(isinstance(tree, Tree) for trees in sections.values()
+                    for tree in trees)
+    header = dict(header, functions=[function_name(function)
+                                    for function in functions],
+                sections=sorted(sections), node_order=ordered)
+    data = json.dumps(header).encode('utf-8')
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as fd:
+        fd.write(MAGIC + struct.pack('<H', VERSION))
+        fd.write(struct.pack('<I', len(data)) + data)
+        for name in header['sections']:
+            write_trees(fd, sections[name], functions, ordered)
+    # os.replace only exists since Python 3.3; os.rename also replaces the
+    # file atomically on POSIX systems
+    getattr(os, 'replace', os.rename)(temporary, path)
+
+
+def read_file(path, functions=None, tree_class=Tree):
+    """
+    Reads a file written by write_file and returns its header, its sections of
+    trees and its function table.
+    :param path:        The path of the file
+    :param functions:   The functions used in the trees (see resolve_functions).
+                        LinearTrees are encoded with this function table
+    :param tree_class:  The class of the trees to build (Tree or LinearTree)
+    """
+    with open(path, 'rb') as fd:
+        if fd.read(4) != MAGIC:
+            raise ValueError('Not a genepy file: %s' % path)
+        version = struct.unpack('<H', fd.read(2))[0]
+        if version != VERSION:
+            raise ValueError('Unsupported file version: %d' % version)
+        length = struct.unpack('<I', fd.read(4))[0]
+        header = json.loads(fd.read(length).decode('utf-8'))
+        table = resolve_functions(header['functions'], functions)
+        sections = dict((name, read_trees(fd, table, tree_class,
+                                            header['node_order']))
+                        for name in header['sections'])
+    if tree_class is LinearTree and functions is not None and \
+        table is not functions:
+        sections = dict((name, [LinearTree.from_prefix(tree.prefix(), functions)
+                                for tree in trees])
+                        for name, trees in sections.items())
+    return header, sections, table
+
+
+def encode_random_state(state):
+    """
+    Returns a random state (see random.getstate) in a form that can be stored
+    in JSON.
+    :param state:   The random state
+    """
+    version, internal_state, gauss_next = state
+    data = array_bytes(_little_endian(array('I', internal_state)))
+    return [version, base64.b64encode(data).decode('ascii'), gauss_next]
+
+
+def decode_random_state(data):
+    """
+    Returns the random state encoded by encode_random_state.
+    :param data:    The encoded random state
+    """
+    version, internal_state, gauss_next = data
+    internal_state = array('I', base64.b64decode(internal_state))
+    return version, tuple(_little_endian(internal_state)), gauss_next
+
+
+def save_model(path, tree, functions):
+    """
+    Saves a single tree, for example the trained tree of an
+    EvolutionaryAlgorithm (see EvolutionaryAlgorithm.save_model).
+    :param path:        The path of the file
+    :param tree:        The tree to save
+    :param functions:   The function table of the tree
+    """
+    write_file(path, {'kind': 'model'}, {'model': [tree]}, functions)
+
+
+def load_model(path, functions=None, tree_class=Tree):
+    """
+    Loads a tree saved with save_model. The returned tree can be used for
+    predictions without the EvolutionaryAlgorithm that trained it.
+    :param path:        The path of the file
+    :param functions:   The functions used in the tree. If not set, they are
+                        imported by name, which requires them to be defined at
+                        the top level of a module
+    :param tree_class:  The class of the tree to build (Tree or LinearTree)
+    """
+    header, sections, table = read_file(path, functions, tree_class)
+    if header.get('kind') != 'model':
+        raise ValueError('Not a model file: %s' % path)
+    return sections['model'][0]
@@ -0,0 +1,66 @@
+import operator
+import numbers
+from . import functions
+
+
+"""
+Functions that are inlined as Python expressions in the generated code instead
+of being called. The templates of INLINE_OPERATORS behave the same way on
+scalars and NumPy arrays, those of INLINE_SCALAR_OPERATORS only on scalars.
+"""
+INLINE_OPERATORS = {
+    functions.add:  '{0} + {1}',
+    functions.sub:  '{0} - {1}',
+    functions.mul:  '{0} * {1}',
+    operator.add:   '{0} + {1}',
+    operator.sub:   '{0} - {1}',
+    operator.mul:   '{0} * {1}',
+}
+
+INLINE_SCALAR_OPERATORS = dict(INLINE_OPERATORS)
+INLINE_SCALAR_OPERATORS[functions.div] = '{0} / {1} if {1} != 0 else 1'
+
+
+def compile_tree(root_node, scalar=True):
+    """
+    Generates a flat Python function computing the output of a tree. The
+    function takes the input features as only parameter; each function node
+    of the tree becomes one assignment to a local variable, so the generated
+    code does not depend on the depth of the tree.
+    :param root_node:   The root node of the tree to compile
+    :param scalar:      If False, the generated function can also be called
+                        with feature columns (NumPy arrays)
+    """
+    inline = INLINE_SCALAR_OPERATORS if scalar else INLINE_OPERATORS
+    namespace = {}
+    names = {}
+    lines = []
+    expressions = {}
+    stack = [(root_node, False)]
+    while stack:
+        node, visited = stack.pop()
+        if isinstance(node.value, str):
+            expressions[node] = 'f[{}]'.format(int(node.value))
+        elif isinstance(node.value, numbers.Number):
+            expressions[node] = repr(node.value)
+        elif not visited:
+            stack.append((node, True))
+            stack.append((node.next_right, False))
+            stack.append((node.next_left, False))
+        else:
+            left = expressions.pop(node.next_left)
+            right = expressions.pop(node.next_right)
+            if node.value in inline:
+                code = inline[node.value].format(left, right)
+            else:
+                if node.value not in names:
+                    names[node.value] = '_f{}'.format(len(names))
+                    namespace[names[node.value]] = node.value
+                code = '{}({}, {})'.format(names[node.value], left, right)
+            temp = 't{}'.format(len(lines))
+            lines.append('    {} = {}'.format(temp, code))
+            expressions[node] = temp
+    lines.append('    return {}'.format(expressions[root_node]))
+    source = 'def tree(f):\n' + '\n'.join(lines) + '\n'
+    exec(compile(source, '<genepy tree>', 'exec'), namespace)
+    return namespace['tree']
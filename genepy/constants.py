@@ -0,0 +1,167 @@
+from .simplify import is_constant
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def parametric_program(values):
+    """
+    Returns the program evaluated by evaluate_parametric for a tree, and the
+    values of its constants: the constants become parameters, numbered in
+    prefix order.
+    :param values:  The values of the nodes of the tree in prefix order
+    """
+    program = []
+    constants = []
+    for value in reversed(values):
+        if hasattr(value, '__call__'):
+            program.append((0, value))
+        elif is_constant(value):
+            program.append((1, len(constants)))
+            constants.append(value)
+        else:
+            program.append((2, int(value)))
+    count = len(constants)
+    program = [(kind, count - 1 - operand) if kind == 1 else (kind, operand)
+                for kind, operand in program]
+    return program, constants[::-1]
+
+
+def evaluate_parametric(program, columns, parameters):
+    """
+    Evaluates a tree for several sets of values of its constants at once.
+    Returns a NumPy array of shape [n_sets, n_samples].
+    :param program:     The program returned by parametric_program
+    :param columns:     The feature columns (see to_columns)
+    :param parameters:  NumPy array of shape [n_sets, n_constants]
+    """
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    with np.errstate(all='ignore'):
+        for kind, operand in program:
+            if kind == 0:
+                left = pop()
+                push(operand(left, pop()))
+            elif kind == 1:
+                push(parameters[:, operand:operand + 1])
+            else:
+                push(columns[operand])
+    output = np.asarray(stack[0], dtype=float)
+    return np.broadcast_to(output, (len(parameters), columns.shape[1]))
+
+
+class ConstantOptimizer(object):
+    """
+    Tunes the constants of a tree to minimise the squared error between its
+    predictions and the targets, with the Levenberg-Marquardt algorithm. The
+    Jacobian is estimated by finite differences, and the tree is evaluated on
+    all the perturbed constants (then on all the tried damping factors) at
+    once, as a batch of NumPy arrays. When none of them reduces the error, the
+    damping is raised and the iteration is tried again, up to MAX_DAMPING. The
+    functions of the trees must work on NumPy arrays (see genepy.functions).
+    :param iterations:  Maximum number of iterations
+    :param damping:     Initial damping factor
+    :param step:        Relative step of the finite differences
+    :param tolerance:   The optimisation stops when an iteration reduces the
+                        error by less than this fraction
+    """
+
+    """
+    Damping factors tried at each iteration, relative to the current one.
+    """
+    DAMPING_FACTORS = (0.1, 1.0, 10.0, 100.0)
+
+    """
+    Damping above which the optimisation gives up when no damping factor
+    reduces the error.
+    """
+    MAX_DAMPING = 1e10
+
+    def __init__(self, iterations=10, damping=1e-3, step=1e-6, tolerance=1e-8):
+        if np is None:
+            raise ImportError('NumPy is required for constant optimization')
+        if iterations < 1:
+            raise AttributeError('Number of iterations must be at least 1')
+        self.iterations = iterations
+        self.damping = damping
+        self.step = step
+        self.tolerance = tolerance
+
+
+    def optimize(self, tree, columns, targets):
+        """
+        Returns the tuned values of the constants of a tree in prefix order, or
+        None if the tree has no constants or its error could not be reduced.
+        :param tree:        The tree (Tree or LinearTree)
+        :param columns:     The feature columns (see to_columns)
+        :param targets:     The target values, as a NumPy array
+        """
+        program, constants = parametric_program(tree.prefix())
+        if not constants:
+            return None
+        parameters = np.array(constants, dtype=float)
+        residuals = evaluate_parametric(program, columns, parameters[None]) - \
+                    targets
+        cost = self.cost(residuals)[0]
+        if not np.isfinite(cost):
+            return None
+        initial = cost
+        damping = self.damping
+        identity = np.eye(len(parameters))
+        hessian = None
+        for _ in range(self.iterations):
+            if hessian is None:
+                steps = self.step * np.maximum(np.abs(parameters), 1.0)
+                perturbed = parameters + identity * steps[:, None]
+                jacobian = (evaluate_parametric(program, columns, perturbed) -
+                            targets - residuals[0]) / steps[:, None]
+                if not np.all(np.isfinite(jacobian)):
+                    break
+                hessian = np.dot(jacobian, jacobian.T)
+                gradient = np.dot(jacobian, residuals[0])
+                scale = np.diag(np.diag(hessian) + 1e-12)
+            trials = []
+            for factor in self.DAMPING_FACTORS:
+                try:
+                    trials.append(parameters - np.linalg.solve(
+                            hessian + damping * factor * scale, gradient))
+                except np.linalg.LinAlgError:
+                    trials.append(parameters)
+            trials = np.array(trials)
+            trial_residuals = evaluate_parametric(program, columns, trials) - \
+                                targets
+            costs = self.cost(trial_residuals)
+            best = int(np.argmin(costs))
+            if not costs[best] < cost:
+                # Smaller steps, closer to gradient descent, from the same
+                # point (the Jacobian is kept)
+                damping *= self.DAMPING_FACTORS[-1]
+                if damping > self.MAX_DAMPING:
+                    break
+                continue
+            improvement = (cost - costs[best]) / max(cost, 1e-300)
+            parameters = trials[best]
+            residuals = trial_residuals[best:best + 1]
+            cost = costs[best]
+            damping *= self.DAMPING_FACTORS[best]
+            hessian = None
+            if improvement < self.tolerance:
+                break
+        if not cost < initial:
+            return None
+        return [float(value) for value in parameters]
+
+
+    def cost(self, residuals):
+        """
+        Returns the sum of the squared residuals of each set of constants, inf
+        when it is not finite.
+        :param residuals:   NumPy array of shape [n_sets, n_samples]
+        """
+        with np.errstate(all='ignore'):
+            costs = np.einsum('ij,ij->i', residuals, residuals)
+        costs[~np.isfinite(costs)] = np.inf
+        return costs
@@ -1,7 +1,43 @@
 import random
-from copy import deepcopy
-from .tree import Tree
+import heapq
+import numbers
+import inspect
+from timeit import default_timer
+from .tree import Tree, to_columns
 from .node import Node
+from .linear import LinearTree
+from .parallel import FitnessPool
+from .cache import FitnessCache
+from .selection import SELECTION_METHODS, TournamentSelection
+from .dag import PopulationEvaluator
+from .islands import TOPOLOGIES, run_islands
+from .sampling import Sampler, sample_indices, take
+from .datasets import ChunkedDataset
+from .bloat import SIZE_CONTROLS, SizeEqualizer
+from .callbacks import EarlyStopping, generation_stats
+from .halloffame import HallOfFame
+from .constants import ConstantOptimizer
+from . import checkpoint
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+"""
+Available representations of the individuals.
+"""
+BACKENDS = {
+    'tree':     Tree,
+    'linear':   LinearTree,
+}
+
+
+"""
+Available evolution modes (see EvolutionaryAlgorithm).
+"""
+MODES = ['generational', 'steady_state']
 
 
 class EvolutionaryAlgorithm:
@@ -18,11 +54,215 @@ class EvolutionaryAlgorithm:
     :param mutation_prob:       Mutation probability when evolving the population
     :param functions:           The functions that can be used in the trees
     :param fitness_function:    The fitness function used to evaluate the population
+    :param vectorized:          If True, the trees are evaluated on whole feature
+                                columns with NumPy and the fitness function is
+                                called as fitness_function(tree, predictions,
+                                targets), predictions and targets being NumPy
+                                arrays of shape [n_samples]
+    :param backend:             Representation of the individuals: 'tree' for
+                                linked nodes (Tree) or 'linear' for compact
+                                arrays in prefix order (LinearTree)
+    :param n_jobs:              Number of processes used to evaluate the fitness
+                                of the population (-1 to use all the CPUs). The
+                                fitness function must then be picklable when
+                                processes are not started with 'fork'
+    :param seed:                Seed of the random generator, to make runs
+                                reproducible. Runs using several processes give
+                                the same results as serial runs as long as the
+                                fitness function does not use random numbers
+    :param cache_size:          If positive, the fitness of up to cache_size
+                                distinct trees is cached during a call to fit,
+                                so identical individuals are evaluated only
+                                once. The number of cache hits and misses is
+                                available in self.fitness_cache
+    :param selection_method:    How individuals are selected: 'mixed' (half
+                                uniformly, half proportionally to their
+                                fitness), 'roulette', 'rank', 'tournament', or
+                                an object with a select(fitness, n) method
+                                returning the indexes of n individuals
+    :param tournament_size:     Number of individuals of each tournament when
+                                using tournament selection
+    :param elitism:             Number of best individuals copied unchanged to
+                                the next generation
+    :param shared_evaluation:   If True (requires vectorized), identical subtrees
+                                of the population are evaluated only once per
+                                generation (see PopulationEvaluator). Not used
+                                when n_jobs != 1
+    :param shared_max_bytes:    Maximum memory used by the intermediate outputs
+                                kept for shared evaluation
+    :param incremental:         If True (requires vectorized and the 'tree'
+                                backend), each function node keeps its output on
+                                the training set, so after a variation only the
+                                nodes between the modified node and the root are
+                                recomputed. Uses one array of n_samples values
+                                per node. Not used when n_jobs != 1
+    :param n_islands:           If greater than 1, number of populations of
+                                nb_trees individuals evolved in parallel in
+                                separate processes (island model). n_jobs is
+                                then not used
+    :param migration_interval:  Number of generations between two migrations of
+                                individuals between the islands
+    :param migration_size:      Number of best individuals sent by each island
+                                at each migration, replacing the worst
+                                individuals of the receiving island
+    :param topology:            Which islands receive the migrants: 'ring',
+                                'fully_connected' or 'random'
+    :param sample_size:         If set, each generation is evaluated on a random
+                                sample of sample_size training examples instead
+                                of the whole training set. Cannot be used with
+                                n_islands
+    :param sampling:            'minibatch' to draw samples of sample_size
+                                examples, or 'progressive' to double the size of
+                                the samples each time the best fitness has not
+                                improved for sampling_patience generations
+    :param sampling_patience:   See sampling
+    :param validation_size:     When sampling, number of best individuals of the
+                                last generation evaluated on the whole training
+                                set to choose the final tree
+    :param depth_limit:         If set, maximum depth of the trees created by
+                                crossover and expansion mutation. Must be at
+                                least max_depth, so the initial trees respect it
+    :param size_limit:          If set, maximum number of nodes of the trees
+                                created by crossover and expansion mutation.
+                                Must be at least 2 ** max_depth - 1, the size
+                                of the largest initial trees
+    :param variation_retries:   Number of attempts to find a crossover or an
+                                expansion respecting depth_limit and size_limit.
+                                The variation is skipped when none is found
+    :param size_control:        'equalisation' to keep the distribution of the
+                                sizes of the trees close to a target computed at
+                                each generation from the fitness of each size
+                                (see SizeEqualizer), or None
+    :param size_bin_width:      Number of different sizes grouped in each bin of
+                                the size distribution, for size equalisation
+    :param simplify_interval:   If set, the trees of the population are
+                                simplified (see Tree.simplify) every
+                                simplify_interval generations. The final tree
+                                is always simplified. In steady-state mode,
+                                only the offspring of every simplify_interval-th
+                                iteration are simplified, the rest of the
+                                population never is
+    :param target_fitness:      If set, training stops once an individual
+                                reaches this fitness
+    :param patience:            If set, training stops when the best fitness of
+                                the generations has not improved for patience
+                                generations. In steady-state mode, patience
+                                counts iterations, each evaluating only
+                                offspring_size trees
+    :param time_budget:         If set, training stops after the generation
+                                during which time_budget seconds have elapsed
+    :param max_evaluations:     If set, training stops after the generation
+                                during which the fitness function has been
+                                computed max_evaluations times
+    :param hall_of_fame_size:   Number of best distinct individuals seen during
+                                training kept in self.hall_of_fame. The final
+                                tree is the best of them
+    :param checkpoint_path:     If set, path of the checkpoint written during
+                                training (see save_checkpoint and resume)
+    :param checkpoint_interval: Number of generations (iterations in
+                                steady-state mode) between two checkpoints
+    :param concurrency:         If the fitness function is a coroutine function
+                                (async def), maximum number of evaluations
+                                running at the same time on the asyncio event
+                                loop. Asynchronous fitness functions cannot be
+                                used with n_jobs != 1
+    :param evaluation_timeout:  If set, maximum number of seconds of each
+                                evaluation of an asynchronous fitness function.
+                                The number of evaluations that timed out is
+                                kept in self.timeouts
+    :param timeout_fitness:     Fitness of the trees whose evaluation timed out.
+                                If None, the worst fitness computed since the
+                                start of the training, kept in
+                                self.worst_fitness (0 until an evaluation
+                                finishes). Timed out trees are never stored in
+                                the fitness cache
+    :param optimization_size:   If positive, number of best individuals whose
+                                constants are tuned to fit the targets (see
+                                ConstantOptimizer) after their evaluation. A
+                                tuned individual replaces the original one if
+                                its fitness is better. Requires NumPy and
+                                functions working on NumPy arrays
+    :param optimization_interval: Number of generations (iterations in
+                                steady-state mode) between two constant
+                                optimizations
+    :param optimization_iterations: Maximum number of iterations of each
+                                constant optimization
+    :param mode:                'generational' to evaluate and replace the whole
+                                population at each iteration, or
+                                'steady_state' to produce offspring_size
+                                offspring at each iteration, evaluate only them
+                                and replace the worst individuals with them.
+                                The fitness of the other individuals is kept.
+                                nb_trees / offspring_size steady-state
+                                iterations evaluate as many trees as one
+                                generation. patience and the *_interval
+                                parameters then count iterations, so they
+                                usually have to be scaled by
+                                nb_trees / offspring_size. Cannot be used with
+                                sample_size or n_islands
+    :param offspring_size:      Number of offspring of each steady-state
+                                iteration. Defaults to a tenth of nb_trees (at
+                                least 2)
     """
 
     def __init__(self, functions, fitness_function, min_depth=2, max_depth=5,
                 nb_trees=100, max_const=20, func_ratio=0.7, var_ratio=0.6,
-                crossover_prob=0.6, mutation_prob=0.3, **args):
+                crossover_prob=0.6, mutation_prob=0.3, vectorized=False,
+                backend='tree', n_jobs=1, seed=None, cache_size=0,
+                selection_method='mixed', tournament_size=3, elitism=0,
+                shared_evaluation=False, shared_max_bytes=None,
+                incremental=False, n_islands=1, migration_interval=10,
+                migration_size=2, topology='ring', sample_size=None,
+                sampling='minibatch', sampling_patience=5, validation_size=5,
+                depth_limit=None, size_limit=None, variation_retries=5,
+                size_control=None, size_bin_width=5, simplify_interval=None,
+                target_fitness=None, patience=None, time_budget=None,
+                max_evaluations=None, hall_of_fame_size=1, checkpoint_path=None,
+                checkpoint_interval=10, concurrency=10,
+                evaluation_timeout=None, timeout_fitness=None,
+                optimization_size=0, optimization_interval=1,
+                optimization_iterations=10, mode='generational',
+                offspring_size=None, **args):
+        if shared_evaluation and not vectorized:
+            raise AttributeError('Shared evaluation requires vectorized=True')
+        if incremental and (not vectorized or backend != 'tree'):
+            raise AttributeError('Incremental evaluation requires vectorized=True '
+                                'and the tree backend')
+        if not topology in TOPOLOGIES:
+            raise AttributeError('Topology must be one of: %s' %
+                                ', '.join(TOPOLOGIES))
+        if not size_control in SIZE_CONTROLS:
+            raise AttributeError('Size control must be one of: %s' %
+                                ', '.join(str(c) for c in SIZE_CONTROLS))
+        # Coroutines only exist since Python 3.5
+        is_coroutine = getattr(inspect, 'iscoroutinefunction',
+                                lambda function: False)
+        async_fitness = is_coroutine(fitness_function) or \
+            is_coroutine(getattr(fitness_function, '__call__', None))
+        if async_fitness and n_jobs != 1:
+            raise AttributeError('Asynchronous fitness functions cannot be used '
+                                'with n_jobs')
+        if not backend in BACKENDS:
+            raise AttributeError('Backend must be one of: %s' %
+                                ', '.join(sorted(BACKENDS)))
+        if depth_limit is not None and depth_limit < max_depth:
+            raise AttributeError('Depth limit must be at least max_depth')
+        if size_limit is not None and size_limit < 2 ** max_depth - 1:
+            raise AttributeError('Size limit must be at least 2 ** max_depth - 1, '
+                                'the size of the largest initial trees')
+        if sample_size is not None and n_islands > 1:
+            raise AttributeError('Sampling cannot be used with n_islands')
+        if not mode in MODES:
+            raise AttributeError('Mode must be one of: %s' % ', '.join(MODES))
+        if offspring_size is None:
+            offspring_size = max(2, nb_trees // 10)
+        if mode == 'steady_state':
+            if sample_size is not None or n_islands > 1:
+                raise AttributeError('Steady-state mode cannot be used with '
+                                    'sample_size or n_islands')
+            if offspring_size < 1 or offspring_size > nb_trees - elitism:
+                raise AttributeError('Offspring size must be between 1 and '
+                                    'nb_trees - elitism')
         self.min_depth  = min_depth
         self.max_depth  = max_depth
         self.nb_trees   = nb_trees
@@ -33,27 +273,431 @@ class EvolutionaryAlgorithm:
         self.mutat_prob = mutation_prob
         self.functions  = functions
         self.fitness    = fitness_function
+        self.vectorized = vectorized
+        self.backend    = backend
+        self.tree_class = BACKENDS[backend]
+        self.n_jobs     = n_jobs
+        self.seed       = seed
+        self.fitness_cache = FitnessCache(cache_size) if cache_size > 0 else None
+        self.elitism    = elitism
+        self.shared_evaluation = shared_evaluation
+        self.shared_max_bytes = shared_max_bytes
+        self.incremental = incremental
+        self.n_islands  = n_islands
+        self.migration_interval = migration_interval
+        self.migration_size = migration_size
+        self.topology   = topology
+        self.sample_size = sample_size
+        self.sampling   = sampling
+        self.sampling_patience = sampling_patience
+        self.validation_size = validation_size
+        self.depth_limit = depth_limit
+        self.size_limit = size_limit
+        self.variation_retries = variation_retries
+        self.size_control = size_control
+        self.size_equalizer = None
+        if size_control == 'equalisation':
+            self.size_equalizer = SizeEqualizer(size_bin_width)
+        self.simplify_interval = simplify_interval
+        self.stopping_criteria = dict(target_fitness=target_fitness,
+                                    patience=patience, time_budget=time_budget,
+                                    max_evaluations=max_evaluations)
+        self.stop_reason = None
+        self.hall_of_fame = HallOfFame(hall_of_fame_size)
+        self.evaluations = 0
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.population = None
+        self.generation = 0
+        self.sampler    = None
+        self.async_fitness = async_fitness
+        self.concurrency = concurrency
+        self.evaluation_timeout = evaluation_timeout
+        self.timeout_fitness = timeout_fitness
+        self.timeouts   = 0
+        self.timed_out  = []
+        self.worst_fitness = None
+        self.optimization_size = optimization_size
+        self.optimization_interval = optimization_interval
+        self.mode       = mode
+        self.offspring_size = offspring_size
+        self.population_fitness = None
+        self.constant_optimizer = None
+        if optimization_size > 0:
+            self.constant_optimizer = ConstantOptimizer(optimization_iterations)
+        if selection_method == 'tournament':
+            selection_method = TournamentSelection(tournament_size)
+        elif selection_method in SELECTION_METHODS:
+            selection_method = SELECTION_METHODS[selection_method]()
+        elif not hasattr(selection_method, 'select'):
+            raise AttributeError('Selection method must be one of: %s' %
+                                ', '.join(sorted(SELECTION_METHODS)))
+        self.selection_method = selection_method
         self.tree       = None
 
 
-    def fit(self, features, targets, iterations=100):
+    def fit(self, features, targets, iterations=100, callbacks=None,
+            state=None):
         """
         Genetic Programming algorithm.
         :param features:    Training examples (array-like / matrix object of
-                            shape [n_samples, n_features])
-        :param targets:     Target values (array-like object of shape [n_samples])
+                            shape [n_samples, n_features]). Can also be a
+                            ChunkedDataset, a NumPy memmap or the path of a .npy
+                            file to read the training set chunk by chunk; the
+                            fitness function must then be a StreamingFitness
+        :param targets:     Target values (array-like object of shape [n_samples],
+                            memmap or path of a .npy file)
         :param iterations:  Maximum number of iterations
+        :param callbacks:   Callback objects notified at each generation (see
+                            genepy.callbacks). Training stops when one of them
+                            returns True from on_generation. Not supported with
+                            n_islands > 1
+        :param state:       The header and the trees of a checkpoint to continue
+                            the training from (see resume)
         """
-        if len(features) == 0 or len(features) != len(targets):
-            raise AttributeError('Invalid features or targets: %s' % key)
+        callbacks = list(callbacks or [])
+        early_stopping = None
+        if any(value is not None for value in self.stopping_criteria.values()):
+            early_stopping = EarlyStopping(**self.stopping_criteria)
+            callbacks.append(early_stopping)
+        if isinstance(features, str) or \
+            (np is not None and isinstance(features, np.memmap)):
+            features = ChunkedDataset(features, targets)
+        if isinstance(features, ChunkedDataset):
+            if not hasattr(self.fitness, 'update'):
+                raise AttributeError('Chunked datasets require a StreamingFitness')
+            if self.n_jobs != 1 or self.n_islands > 1 or \
+                self.sample_size is not None or \
+                self.constant_optimizer is not None:
+                raise AttributeError('Chunked datasets cannot be used with '
+                                    'n_jobs, n_islands, sample_size or '
+                                    'optimization_size')
+        elif len(features) == 0 or len(features) != len(targets):
+            raise AttributeError('Invalid features or targets')
+        if self.n_islands > 1:
+            if callbacks or self.checkpoint_path is not None or \
+                state is not None:
+                raise AttributeError('Callbacks, stopping criteria and '
+                                    'checkpoints cannot be used with n_islands')
+            self.tree = run_islands(self, features, targets, iterations)
+            self.tree.simplify()
+            return
 
-        variables = [str(i) for i in range(len(features[0]))]
-        trees = self.create_trees(variables)
-        for i in range(iterations):
-            fitness = [self.fitness(tree, features, targets) for tree in trees]
+        if self.seed is not None:
+            random.seed(self.seed)
+        if self.fitness_cache is not None:
+            self.fitness_cache.clear()
+        self.hall_of_fame.clear()
+        self.evaluations = 0
+        self.timeouts = 0
+        self.worst_fitness = None
+        self.generation = 0
+        self.population_fitness = None
+        variables, features, targets = self.prepare_data(features, targets)
+        data = self.optimization_data(features, targets)
+        pool = None
+        if self.n_jobs != 1:
+            pool = FitnessPool(self.n_jobs, self.fitness, self.functions,
+                                self.tree_class, self.vectorized,
+                                features, targets, self.seed)
+        self.sampler = sampler = None
+        if self.sample_size is not None:
+            self.sampler = sampler = Sampler(len(targets), self.sample_size,
+                                            self.sampling,
+                                            self.sampling_patience)
+        if state is not None:
+            self.restore_state(*state)
+            if pool is not None:
+                pool.generation = self.generation
+        for callback in callbacks:
+            callback.on_fit_start(self)
+        try:
+            if state is None:
+                self.population = self.create_trees(variables)
+            if self.mode == 'steady_state':
+                self.run_steady_state(variables, features, targets, data, pool,
+                                    iterations, callbacks)
+            else:
+                self.run_generations(variables, features, targets, data, pool,
+                                    iterations, callbacks)
+        finally:
+            if pool is not None:
+                pool.close()
+        self.stop_reason = early_stopping.reason if early_stopping else None
+        self.tree = self.hall_of_fame.best.copy()
+        self.tree.simplify()
+        if self.incremental:
+            # The outputs cached on the training set are not used anymore
+            for tree in [self.tree] + self.hall_of_fame.trees + self.population:
+                tree.clear_outputs()
+        for callback in callbacks:
+            callback.on_fit_end(self)
+
+
+    def run_generations(self, variables, features, targets, data, pool,
+                        iterations, callbacks):
+        """
+        Evolves self.population generation by generation: the whole population
+        is evaluated, then replaced by the offspring of the selected
+        individuals. Called by fit.
+        :param variables:   The available variables
+        :param features:    Training examples, as returned by prepare_data
+        :param targets:     Target values, as returned by prepare_data
+        :param data:        The data returned by optimization_data
+        :param pool:        If set, the FitnessPool used to evaluate the trees
+        :param iterations:  Maximum number of generations
+        :param callbacks:   The callbacks notified at each generation
+        """
+        sampler = self.sampler
+        trees = self.population
+        for i in range(self.generation, iterations):
+            start = default_timer()
+            sample = None
+            if sampler is None:
+                fitness = self.evaluate(trees, features, targets, pool)
+            else:
+                sample = sampler.next()
+                fitness = self.evaluate_sample(trees, features, targets,
+                                                sample, pool)
+            evaluated = default_timer()
+            self.optimize_constants(trees, fitness, i, data, features,
+                                    targets, sample, pool)
+            optimized = default_timer()
+            if sampler is not None:
+                sampler.update(max(fitness))
+            self.hall_of_fame.update(trees, fitness)
+            sizes = [len(tree) for tree in trees] if callbacks else None
             trees = self.selection(trees, fitness)
-            trees = self.generate_next_population(trees, variables)
-        self.tree = trees[fitness.index(max(fitness))]
+            selected = default_timer()
+            timings = {'evaluation': evaluated - start}
+            if self.constant_optimizer is not None:
+                timings['optimization'] = optimized - evaluated
+            timings['selection'] = selected - optimized
+            trees = self.generate_next_population(trees, variables,
+                                self.tree_evaluator(features, targets, sample,
+                                                    pool))
+            self.simplify_trees(trees, i)
+            varied = default_timer()
+            self.population = trees
+            self.generation = i + 1
+            timings['variation'] = varied - selected
+            stop = callbacks and self.notify_generation(callbacks, i,
+                                fitness, sizes, timings, sample)
+            if self.checkpoint_path is not None and (stop or
+                self.generation % self.checkpoint_interval == 0):
+                self.save_checkpoint(self.checkpoint_path)
+            if stop:
+                break
+        if sampler is not None:
+            fitness = self.evaluate_sample(trees, features, targets,
+                                            sampler.next(), pool)
+            best = heapq.nlargest(self.validation_size, range(len(trees)),
+                                    key=fitness.__getitem__)
+            trees = [trees[i] for i in best] + self.hall_of_fame.trees
+            self.set_sample(None, pool)
+            fitness = self.evaluate(trees, features, targets, pool)
+            self.hall_of_fame.clear()
+            self.hall_of_fame.update(trees, fitness)
+
+
+    def run_steady_state(self, variables, features, targets, data, pool,
+                        iterations, callbacks):
+        """
+        Evolves self.population in steady state: at each iteration,
+        self.offspring_size offspring of selected individuals are evaluated and
+        replace the worst individuals. Only the offspring are evaluated, the
+        fitness of the population is kept in self.population_fitness. Called
+        by fit.
+        :param variables:   The available variables
+        :param features:    Training examples, as returned by prepare_data
+        :param targets:     Target values, as returned by prepare_data
+        :param data:        The data returned by optimization_data
+        :param pool:        If set, the FitnessPool used to evaluate the trees
+        :param iterations:  Maximum number of iterations
+        :param callbacks:   The callbacks notified at each iteration
+        """
+        trees = self.population
+        if self.population_fitness is None:
+            self.population_fitness = self.evaluate(trees, features, targets,
+                                                    pool)
+            self.hall_of_fame.update(trees, self.population_fitness)
+        fitness = self.population_fitness
+        for i in range(self.generation, iterations):
+            start = default_timer()
+            if self.size_equalizer is not None:
+                self.size_equalizer.update(trees, fitness)
+            parents = self.selection_method.select(fitness, self.offspring_size)
+            selected = default_timer()
+            offspring = self.vary([trees[j].copy() for j in parents], variables,
+                                self.tree_evaluator(features, targets,
+                                                    pool=pool))
+            self.simplify_trees(offspring, i)
+            varied = default_timer()
+            offspring_fitness = self.evaluate(offspring, features, targets, pool)
+            evaluated = default_timer()
+            self.optimize_constants(offspring, offspring_fitness, i, data,
+                                    features, targets, pool=pool)
+            optimized = default_timer()
+            self.hall_of_fame.update(offspring, offspring_fitness)
+            worst = heapq.nsmallest(len(offspring), range(len(trees)),
+                                    key=fitness.__getitem__)
+            for j, tree, fit in zip(worst, offspring, offspring_fitness):
+                trees[j] = tree
+                fitness[j] = fit
+            self.generation = i + 1
+            timings = {'selection': selected - start,
+                    'variation': varied - selected,
+                    'evaluation': evaluated - varied}
+            if self.constant_optimizer is not None:
+                timings['optimization'] = optimized - evaluated
+            stop = callbacks and self.notify_generation(callbacks, i,
+                                fitness, [len(tree) for tree in trees], timings)
+            if self.checkpoint_path is not None and (stop or
+                self.generation % self.checkpoint_interval == 0):
+                self.save_checkpoint(self.checkpoint_path)
+            if stop:
+                break
+
+
+    def save_checkpoint(self, path):
+        """
+        Saves the state of the current training (population, hall of fame,
+        random state, sampler and counters) in a compact binary file, so it can
+        be continued with resume. Can be called between two generations, for
+        example from a callback, or after fit.
+        :param path:    The path of the file
+        """
+        if self.population is None:
+            raise ValueError('Algorithm not trained')
+        header = {
+            'kind':         'checkpoint',
+            'backend':      self.backend,
+            'generation':   self.generation,
+            'evaluations':  self.evaluations,
+            'random_state': checkpoint.encode_random_state(random.getstate()),
+            'hall_of_fame': self.hall_of_fame.fitness,
+            'sampler':      None,
+            'fitness':      self.population_fitness,
+        }
+        if self.sampler is not None:
+            header['sampler'] = {'size': self.sampler.size,
+                                'best': self.sampler.best,
+                                'stagnation': self.sampler.stagnation}
+        checkpoint.write_file(path, header,
+                            {'population': self.population,
+                            'hall_of_fame': self.hall_of_fame.trees},
+                            self.functions)
+
+
+    def resume(self, path, features, targets, iterations=100, callbacks=None):
+        """
+        Continues a training from a checkpoint written by save_checkpoint. The
+        algorithm must have the same parameters as the one that wrote it, and
+        features and targets must be the same training set. The stopping
+        criteria start again from the checkpoint (the time budget, for
+        example, applies to the resumed part only).
+        :param path:        The path of the checkpoint
+        :param features:    Training examples (see fit)
+        :param targets:     Target values
+        :param iterations:  Total number of generations, including the ones done
+                            before the checkpoint
+        :param callbacks:   Callback objects notified at each generation
+        """
+        header, sections, table = checkpoint.read_file(path, self.functions,
+                                                        self.tree_class)
+        if header.get('kind') != 'checkpoint':
+            raise ValueError('Not a checkpoint file: %s' % path)
+        if len(sections['population']) != self.nb_trees:
+            raise AttributeError('The checkpoint holds %d trees instead of %d' %
+                                (len(sections['population']), self.nb_trees))
+        self.fit(features, targets, iterations, callbacks, (header, sections))
+
+
+    def restore_state(self, header, sections):
+        """
+        Restores the state of a training saved by save_checkpoint. Called by fit
+        when it is resumed, after the training data has been prepared.
+        :param header:      The header of the checkpoint
+        :param sections:    The trees of the checkpoint
+        """
+        random.setstate(checkpoint.decode_random_state(header['random_state']))
+        self.generation = header['generation']
+        self.evaluations = header['evaluations']
+        self.population = sections['population']
+        self.population_fitness = header.get('fitness')
+        if self.population_fitness:
+            self.worst_fitness = min(self.population_fitness)
+        self.hall_of_fame.update(sections['hall_of_fame'], header['hall_of_fame'])
+        if self.sampler is not None and header['sampler'] is not None:
+            self.sampler.size = header['sampler']['size']
+            self.sampler.best = header['sampler']['best']
+            self.sampler.stagnation = header['sampler']['stagnation']
+
+
+    def save_model(self, path):
+        """
+        Saves the trained tree in a compact binary file, which can be loaded
+        with genepy.checkpoint.load_model for predictions.
+        :param path:    The path of the file
+        """
+        if self.tree is None:
+            raise ValueError('Algorithm not trained')
+        checkpoint.save_model(path, self.tree, self.functions)
+
+
+    def notify_generation(self, callbacks, generation, fitness, sizes, timings,
+                        sample=None):
+        """
+        Calls the on_generation method of the callbacks with the statistics of
+        a generation, and returns True if one of them asks to stop the training.
+        :param callbacks:   The callbacks
+        :param generation:  The index of the generation
+        :param fitness:     The fitness of the individuals of the generation
+        :param sizes:       The number of nodes of the individuals
+        :param timings:     The seconds spent in each step of the generation
+        :param sample:      The sample the generation was evaluated on, if any
+        """
+        stats = generation_stats(generation, fitness, sizes, timings)
+        stats['evaluations'] = self.evaluations
+        if self.fitness_cache is not None:
+            stats['cache_hits'] = self.fitness_cache.hits
+            stats['cache_misses'] = self.fitness_cache.misses
+        if self.async_fitness:
+            stats['timeouts'] = self.timeouts
+        if sample is not None:
+            stats['sample_size'] = sample[1]
+        return any([callback.on_generation(self, stats)
+                    for callback in callbacks])
+
+
+    def prepare_data(self, features, targets):
+        """
+        Returns the names of the variables and the training data in the form
+        expected by evaluate (feature columns if the algorithm is vectorized).
+        :param features:    Training examples
+        :param targets:     Target values
+        """
+        if isinstance(features, ChunkedDataset):
+            return [str(i) for i in range(features.n_features)], features, None
+        variables = [str(i) for i in range(len(features[0]))]
+        if self.vectorized:
+            features = to_columns(features)
+            targets = np.asarray(targets, dtype=float)
+        return variables, features, targets
+
+
+    def optimization_data(self, features, targets):
+        """
+        Returns the feature columns and the target values used to tune the
+        constants (see optimize_constants), or None if constants are not tuned.
+        :param features:    Training examples, as returned by prepare_data
+        :param targets:     Target values, as returned by prepare_data
+        """
+        if self.constant_optimizer is None:
+            return None
+        if self.vectorized:
+            return features, targets
+        return to_columns(features), np.asarray(targets, dtype=float)
 
 
     def predict(self, feature):
@@ -66,6 +710,179 @@ class EvolutionaryAlgorithm:
         return self.tree.predict(feature)
 
 
+    def predict_batch(self, features):
+        """
+        Predicts the values for a set of inputs, evaluating the trained tree on
+        whole feature columns. Requires NumPy.
+        :param features:    Inputs for prediction (array-like / matrix object of
+                            shape [n_samples, n_features])
+        """
+        if self.tree is None:
+            raise ValueError('Algorithm not trained')
+        return self.tree.predict_batch(features)
+
+
+    def evaluate(self, trees, features, targets, pool=None):
+        """
+        Computes the fitness of each tree of the population, using the fitness
+        cache if enabled.
+        :param trees:       The population to evaluate
+        :param features:    Training examples, as feature columns if the
+                            algorithm is vectorized
+        :param targets:     Target values
+        :param pool:        If set, the FitnessPool used to evaluate the trees
+        """
+        cache = self.fitness_cache
+        if cache is None:
+            return self.compute_fitness(trees, features, targets, pool)
+        keys = [tree.structural_key() for tree in trees]
+        fitness = [None] * len(trees)
+        missing = {}
+        for i, key in enumerate(keys):
+            if key in missing:
+                cache.hits += 1
+            else:
+                fitness[i] = cache.get(key)
+                if fitness[i] is None:
+                    missing[key] = i
+        missing_keys = list(missing)
+        computed = self.compute_fitness([trees[missing[key]]
+                                        for key in missing_keys],
+                                        features, targets, pool)
+        # The fitness given to the trees whose evaluation timed out is only a
+        # placeholder, which must not be reused by the following generations
+        timed_out = set(missing_keys[i] for i in self.timed_out)
+        computed = dict(zip(missing_keys, computed))
+        for key in missing_keys:
+            if not key in timed_out:
+                cache.put(key, computed[key])
+        return [computed[key] if fit is None else fit
+                for key, fit in zip(keys, fitness)]
+
+
+    def evaluate_sample(self, trees, features, targets, sample, pool=None):
+        """
+        Computes the fitness of each tree on a sample of the training data.
+        :param trees:       The population to evaluate
+        :param features:    Training examples, as feature columns if the
+                            algorithm is vectorized
+        :param targets:     Target values
+        :param sample:      The sample, returned by Sampler.next
+        :param pool:        If set, the FitnessPool used to evaluate the trees
+        """
+        self.set_sample(sample, pool)
+        if pool is not None:
+            return self.evaluate(trees, features, targets, pool)
+        features, targets = take(features, targets, sample_indices(sample),
+                                self.vectorized)
+        return self.evaluate(trees, features, targets)
+
+
+    def set_sample(self, sample, pool=None):
+        """
+        Changes the data used by the following evaluations, discarding the
+        fitness values cached for the previous data.
+        :param sample:  The sample returned by Sampler.next, or None for the
+                        whole training set
+        :param pool:    If set, the FitnessPool used to evaluate the trees
+        """
+        if self.fitness_cache is not None:
+            self.fitness_cache.clear(reset_counters=False)
+        if pool is not None:
+            pool.set_sample(sample)
+
+
+    def compute_fitness(self, trees, features, targets, pool=None):
+        """
+        Computes the fitness of each tree without using the fitness cache.
+        :param trees:       The trees to evaluate
+        :param features:    Training examples, as feature columns if the
+                            algorithm is vectorized
+        :param targets:     Target values
+        :param pool:        If set, the FitnessPool used to evaluate the trees
+        """
+        self.evaluations += len(trees)
+        self.timed_out = []
+        if pool is not None:
+            return pool.evaluate(trees)
+        if isinstance(features, ChunkedDataset):
+            return self.compute_streaming_fitness(trees, features)
+        if self.async_fitness:
+            return self.compute_async_fitness(trees, features, targets)
+        return [self.fitness(tree, inputs, targets)
+                for tree, inputs in self.fitness_inputs(trees, features)]
+
+
+    def fitness_inputs(self, trees, features):
+        """
+        Yields each tree with the data passed to the fitness function: its
+        predictions if the algorithm is vectorized, the features otherwise.
+        :param trees:       The trees to evaluate
+        :param features:    Training examples, as feature columns if the
+                            algorithm is vectorized
+        """
+        if self.shared_evaluation:
+            evaluator = PopulationEvaluator(features, self.shared_max_bytes)
+            for tree, predictions in zip(trees, evaluator.evaluate(trees)):
+                yield tree, predictions
+        elif self.incremental:
+            for tree in trees:
+                yield tree, tree.predict_columns(features, cache=True)
+        elif self.vectorized:
+            for tree in trees:
+                yield tree, tree.predict_columns(features)
+        else:
+            for tree in trees:
+                yield tree, features
+
+
+    def compute_async_fitness(self, trees, features, targets):
+        """
+        Computes the fitness of each tree with the asynchronous self.fitness,
+        running up to self.concurrency evaluations concurrently. The trees
+        whose evaluation exceeds self.evaluation_timeout get self.timeout_fitness
+        (or self.worst_fitness), and their indexes are kept in self.timed_out.
+        :param trees:       The trees to evaluate
+        :param features:    Training examples, as feature columns if the
+                            algorithm is vectorized
+        :param targets:     Target values
+        """
+        from .asynchronous import evaluate_concurrently
+        fitness = evaluate_concurrently(self.fitness,
+                                        self.fitness_inputs(trees, features),
+                                        targets, self.concurrency,
+                                        self.evaluation_timeout)
+        finished = [fit for fit in fitness if fit is not None]
+        if finished and (self.worst_fitness is None or
+                        min(finished) < self.worst_fitness):
+            self.worst_fitness = min(finished)
+        self.timed_out = [i for i, fit in enumerate(fitness) if fit is None]
+        if not self.timed_out:
+            return fitness
+        self.timeouts += len(self.timed_out)
+        worst = self.timeout_fitness
+        if worst is None:
+            worst = self.worst_fitness if self.worst_fitness is not None else 0
+        return [worst if fit is None else fit for fit in fitness]
+
+
+    def compute_streaming_fitness(self, trees, dataset):
+        """
+        Computes the fitness of each tree on a chunked dataset with the
+        StreamingFitness self.fitness. Each chunk is read once for the whole
+        population.
+        :param trees:   The trees to evaluate
+        :param dataset: The ChunkedDataset
+        """
+        states = [self.fitness.start(tree) for tree in trees]
+        for columns, targets in dataset.chunks():
+            states = [self.fitness.update(state, tree.predict_columns(columns),
+                                        targets)
+                    for tree, state in zip(trees, states)]
+        return [self.fitness.finish(state, tree)
+                for tree, state in zip(trees, states)]
+
+
     def create_trees(self, variables):
         """
         Generates the random population used during the training.
@@ -75,7 +892,7 @@ class EvolutionaryAlgorithm:
         depths = range(self.min_depth, self.max_depth + 1)
         for i in range(self.nb_trees):
             depth = random.choice(depths)
-            tree = Tree(depth, self.max_const, self.func_ratio, self.var_ratio,
+            tree = self.tree_class(depth, self.max_const, self.func_ratio, self.var_ratio,
                         self.functions, variables,
                         'grow' if i % 2 == 0 else 'full')
             trees.append(tree)
@@ -84,33 +901,84 @@ class EvolutionaryAlgorithm:
 
     def selection(self, trees, fitness):
         """
-        Emulates a selection process. Select individuals with probability
-        proportional to their fitness value.
+        Emulates a selection process. The self.elitism best individuals are
+        placed first, followed by individuals chosen with self.selection_method.
+        With size equalisation, the target size distribution of the next
+        generation is also computed from the current population.
         :param trees:   The current population
         :param fitness: The fitness of the current population
         """
-        fitness = [fit / sum(fitness) for fit in fitness]
-        fitness = [sum(fitness[:i+1]) for i in range(len(fitness))]
+        if self.size_equalizer is not None:
+            self.size_equalizer.update(trees, fitness)
+        elites = heapq.nlargest(self.elitism, range(len(fitness)),
+                                key=fitness.__getitem__)
+        indices = elites + self.selection_method.select(fitness,
+                                                        len(trees) - len(elites))
+        return self.copy_trees(trees, indices)
+
+
+    def copy_trees(self, trees, indices):
+        """
+        Returns the trees at the given indexes. The first occurrence of a tree is
+        the tree itself and the following ones are copies, which share their
+        nodes with it until one of them is modified (copy on write).
+        :param trees:   The current population
+        :param indices: The indexes of the selected trees
+        """
         new_trees = []
-        for i in range(len(trees)):
-            if i % 2 == 0:
-                new_trees.append(deepcopy(random.choice(trees)))
+        selected = set()
+        for index in indices:
+            if index in selected:
+                new_trees.append(trees[index].copy())
             else:
-                rand = random.random()
-                selected = 0
-                for idx, fit in enumerate(fitness):
-                    if rand <= fit:
-                        selected = idx
-                        break
-                new_trees.append(deepcopy(trees[selected]))
+                selected.add(index)
+                new_trees.append(trees[index])
         return new_trees
 
 
-    def generate_next_population(self, trees, variables):
+    def generate_next_population(self, trees, variables, evaluate=None):
         """
         Generate next population by applying variation operators to individuals.
-        :param trees:       The current population
+        With size equalisation, an offspring whose size is not accepted by
+        self.size_equalizer is replaced by its parent.
+        :param trees:       The current population, starting with the
+                            self.elitism individuals that are kept unchanged
+        :param variables:   The available variables
+        :param evaluate:    If set, function returning the fitness of an
+                            offspring, used by size equalisation to accept
+                            offspring larger than the current population (see
+                            tree_evaluator)
+        """
+        return trees[:self.elitism] + self.vary(trees[self.elitism:], variables,
+                                                evaluate)
+
+
+    def tree_evaluator(self, features, targets, sample=None, pool=None):
+        """
+        Returns a function computing the fitness of one tree on the data the
+        current generation is evaluated on, or None without size equalisation
+        (see SizeEqualizer.accept).
+        :param features:    Training examples, as returned by prepare_data
+        :param targets:     Target values, as returned by prepare_data
+        :param sample:      The sample of the generation, if any
+        :param pool:        If set, the FitnessPool used to evaluate the trees
+        """
+        if self.size_equalizer is None:
+            return None
+        if sample is not None and pool is None:
+            features, targets = take(features, targets, sample_indices(sample),
+                                    self.vectorized)
+        return lambda tree: self.evaluate([tree], features, targets, pool)[0]
+
+
+    def vary(self, trees, variables, evaluate=None):
+        """
+        Applies the variation operators to consecutive pairs of trees, which
+        are modified, and returns the resulting trees (see
+        generate_next_population).
+        :param trees:       The trees to vary
         :param variables:   The available variables
+        :param evaluate:    See generate_next_population
         """
         new_generation = []
         it = iter(trees)
@@ -119,6 +987,9 @@ class EvolutionaryAlgorithm:
             except:
                 new_generation.append(tree)
                 continue
+            parents = None
+            if self.size_equalizer is not None:
+                parents = (tree.copy(), next_tree.copy())
             rand = random.random()
             probabilities = [self.cross_prob, self.cross_prob + self.mutat_prob]
             if rand <= probabilities[0]:
@@ -128,20 +999,112 @@ class EvolutionaryAlgorithm:
                                 self.expansion_mutation, self.collapse_mutation]
                 random.choice(mutation_funcs)(tree, variables)
                 random.choice(mutation_funcs)(next_tree, variables)
+            if parents is not None:
+                if not self.size_equalizer.accept(tree, evaluate):
+                    tree = parents[0]
+                if not self.size_equalizer.accept(next_tree, evaluate):
+                    next_tree = parents[1]
             new_generation.append(tree)
             new_generation.append(next_tree)
         return new_generation
 
 
+    def optimize_constants(self, trees, fitness, generation, data, features,
+                            targets, sample=None, pool=None):
+        """
+        Tunes the constants of the self.optimization_size best trees every
+        self.optimization_interval generations (see ConstantOptimizer). A tuned
+        tree replaces the original tree when its fitness is better: trees and
+        fitness are updated in place.
+        :param trees:       The evaluated population
+        :param fitness:     The fitness of the population
+        :param generation:  The index of the generation
+        :param data:        The data returned by optimization_data
+        :param features:    Training examples, as feature columns if the
+                            algorithm is vectorized
+        :param targets:     Target values
+        :param sample:      The sample the population was evaluated on, if any
+        :param pool:        If set, the FitnessPool used to evaluate the trees
+        """
+        if self.constant_optimizer is None or \
+            generation % self.optimization_interval != 0:
+            return
+        columns, values = data
+        if sample is not None:
+            indices = sample_indices(sample)
+            columns, values = columns[:, indices], values[indices]
+        indexes = []
+        tuned = []
+        for i in heapq.nlargest(self.optimization_size, range(len(trees)),
+                                key=fitness.__getitem__):
+            constants = self.constant_optimizer.optimize(trees[i], columns,
+                                                        values)
+            if constants is not None:
+                tree = trees[i].copy()
+                tree.set_constants(constants)
+                indexes.append(i)
+                tuned.append(tree)
+        if not tuned:
+            return
+        if sample is None:
+            tuned_fitness = self.evaluate(tuned, features, targets, pool)
+        else:
+            tuned_fitness = self.evaluate_sample(tuned, features, targets,
+                                                sample, pool)
+        for i, tree, fit in zip(indexes, tuned, tuned_fitness):
+            if fit > fitness[i]:
+                trees[i] = tree
+                fitness[i] = fit
+
+
+    def simplify_trees(self, trees, generation):
+        """
+        Simplifies the trees of the population at the end of every
+        self.simplify_interval generations.
+        :param trees:       The population
+        :param generation:  The index of the generation that produced it
+        """
+        if self.simplify_interval is None or \
+            (generation + 1) % self.simplify_interval != 0:
+            return
+        for tree in trees:
+            tree.simplify()
+
+
     def crossover(self, left_tree, right_tree):
         """
         Performs a cross-over between two trees. Randomly selects a node in each
-        tree and exchanges them.
+        tree and exchanges them. When one of the resulting trees would exceed
+        self.depth_limit or self.size_limit, other nodes are chosen, up to
+        self.variation_retries times before giving up.
         :param left_tree:   The left tree used to perform crossover
         :param right_tree:  The right tree used to perform crossover
         """
-        left_node = left_tree.remove_random_node()
-        right_node = right_tree.remove_random_node()
+        if len(left_tree) == 1 or len(right_tree) == 1: return
+        if isinstance(left_tree, LinearTree):
+            for _ in range(self.variation_retries):
+                left_index = left_tree.pick_random_node()
+                right_index = right_tree.pick_random_node()
+                if self.allows_crossover(left_tree, left_index,
+                                        right_tree, right_index):
+                    break
+            else:
+                return
+            left_subtree = left_tree.subtree(left_index)
+            left_tree.replace_subtree(left_index, *right_tree.subtree(right_index))
+            right_tree.replace_subtree(right_index, *left_subtree)
+            return
+        left_tree.ensure_writable()
+        right_tree.ensure_writable()
+        for _ in range(self.variation_retries):
+            left_node = left_tree.pick_random_node()
+            right_node = right_tree.pick_random_node()
+            if self.allows_crossover(left_tree, left_node, right_tree, right_node):
+                break
+        else:
+            return
+        left_tree.remove_children_nodes(left_node)
+        right_tree.remove_children_nodes(right_node)
         left_prev = left_node.prev
         right_prev = right_node.prev
         if left_node == left_prev.next_left:
@@ -156,6 +1119,43 @@ class EvolutionaryAlgorithm:
         right_node.prev = left_prev
         left_tree.add_node(right_node)
         right_tree.add_node(left_node)
+        left_tree.invalidate(left_prev)
+        right_tree.invalidate(right_prev)
+
+
+    def allows_crossover(self, left_tree, left_node, right_tree, right_node):
+        """
+        Returns True if exchanging two subtrees keeps both trees within
+        self.depth_limit and self.size_limit.
+        :param left_tree:   The first tree
+        :param left_node:   The root of the subtree of the first tree
+        :param right_tree:  The second tree
+        :param right_node:  The root of the subtree of the second tree
+        """
+        return self.allows_replacement(left_tree, left_node,
+                                        right_tree, right_node) and \
+                self.allows_replacement(right_tree, right_node,
+                                        left_tree, left_node)
+
+
+    def allows_replacement(self, tree, node, subtree, subtree_node):
+        """
+        Returns True if replacing the subtree starting at a node of a tree by a
+        subtree of another tree keeps the tree within self.depth_limit and
+        self.size_limit.
+        :param tree:            The modified tree
+        :param node:            The root of the replaced subtree (a node, or an
+                                index for a LinearTree)
+        :param subtree:         The tree holding the new subtree
+        :param subtree_node:    The root of the new subtree
+        """
+        if self.size_limit is not None and len(tree) - tree.subtree_size(node) + \
+            subtree.subtree_size(subtree_node) > self.size_limit:
+            return False
+        if self.depth_limit is not None and tree.node_depth(node) - 1 + \
+            subtree.subtree_height(subtree_node) > self.depth_limit:
+            return False
+        return True
 
 
     def single_point_mutation(self, tree, variables):
@@ -164,29 +1164,76 @@ class EvolutionaryAlgorithm:
         :param tree:        The tree to apply mutation on
         :param variables:   The different available variables
         """
+        if len(tree) == 1: return
+        if isinstance(tree, LinearTree):
+            index = tree.pick_random_node()
+            tree.set_value(index, self.mutated_value(tree.value_at(index),
+                                                    variables))
+            return
+        tree.ensure_writable()
         random_node = tree.pick_random_node()
-        if isinstance(random_node.value, int) or isinstance(random_node.value, str):
-            rand = random.random()
-            if rand <= self.var_ratio:
-                random_node.value = random.choice(variables)
-            else:
-                random_node.value = random.choice(range(self.max_const))
-        else:
-            random_node.value = random.choice(self.functions)
+        random_node.value = self.mutated_value(random_node.value, variables)
+        tree.invalidate(random_node)
+
+
+    def mutated_value(self, value, variables):
+        """
+        Returns a random value of the same kind (function or value) as the given
+        node value.
+        :param value:       The value of the node to mutate
+        :param variables:   The different available variables
+        """
+        if isinstance(value, (numbers.Number, str)):
+            return self.random_terminal(variables)
+        return random.choice(self.functions)
+
+
+    def random_terminal(self, variables):
+        """
+        Returns a random variable or constant, variables being chosen with a
+        probability of self.var_ratio.
+        :param variables:   The different available variables
+        """
+        rand = random.random()
+        if rand <= self.var_ratio:
+            return random.choice(variables)
+        return random.choice(range(self.max_const))
 
 
     def expansion_mutation(self, tree, variables):
         """
         Randomly chooses a node that contains a value (constant or variable) and
         replace it by a subtree containing at least three nodes and with a
-        maximum depth of self.min_depth.
+        maximum depth of self.min_depth. New subtrees are generated, up to
+        self.variation_retries times, until the tree respects self.depth_limit
+        and self.size_limit; otherwise the tree is left unchanged.
         :param tree:        The tree to apply mutation on
         :param variables:   The different variables available
         """
+        if len(tree) == 1: return
+        if isinstance(tree, LinearTree):
+            index = tree.pick_random_node(content='value')
+            for _ in range(self.variation_retries):
+                subtree = LinearTree(self.min_depth, self.max_const,
+                                    self.func_ratio, self.var_ratio,
+                                    self.functions, variables, 'grow')
+                if self.allows_replacement(tree, index, subtree, 0):
+                    break
+            else:
+                return
+            tree.replace_subtree(index, subtree.opcodes, subtree.operands)
+            return
+        tree.ensure_writable()
         rand_node = tree.pick_random_node(content='value')
         rand_prev = rand_node.prev
-        subtree = Tree(self.min_depth, self.max_const, self.func_ratio,
-                        self.var_ratio, self.functions, variables, 'grow')
+        for _ in range(self.variation_retries):
+            subtree = Tree(self.min_depth, self.max_const, self.func_ratio,
+                            self.var_ratio, self.functions, variables, 'grow')
+            if self.allows_replacement(tree, rand_node,
+                                        subtree, subtree.root_node):
+                break
+        else:
+            return
         subtree.root_node.prev = rand_prev
         if rand_node == rand_prev.next_left:
             rand_prev.next_left = subtree.root_node
@@ -194,6 +1241,7 @@ class EvolutionaryAlgorithm:
             rand_prev.next_right = subtree.root_node
         tree.remove_children_nodes(rand_node)
         tree.add_node(subtree.root_node)
+        tree.invalidate(rand_prev)
 
 
     def collapse_mutation(self, tree, variables):
@@ -204,15 +1252,18 @@ class EvolutionaryAlgorithm:
         :param variables:   The different variables available
         """
         if not tree.has_function_node(): return
+        if isinstance(tree, LinearTree):
+            index = tree.pick_random_node(content='function')
+            tree.replace_subtree(index,
+                                *tree.encode([self.random_terminal(variables)]))
+            return
+        tree.ensure_writable()
         rand_node = tree.pick_random_node(content='function')
-        rand = random.random()
-        if rand <= self.var_ratio:
-            new_node = Node(random.choice(variables), rand_node.prev)
-        else:
-            new_node = Node(random.choice(range(self.max_const)), rand_node.prev)
+        new_node = Node(self.random_terminal(variables), rand_node.prev)
         if rand_node == rand_node.prev.next_left:
             rand_node.prev.next_left = new_node
         else:
             rand_node.prev.next_right = new_node
         tree.remove_children_nodes(rand_node)
         tree.add_node(new_node)
+        tree.invalidate(new_node.prev)
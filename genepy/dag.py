@@ -0,0 +1,141 @@
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class PopulationEvaluator(object):
+    """
+    Evaluates a whole population on feature columns, computing each distinct
+    subtree only once. All the subtrees of the population are hash-consed into
+    a directed acyclic graph (identical subtrees become a single node of the
+    graph), whose nodes are evaluated in order. The output of a node is kept
+    until all the nodes using it have been evaluated.
+    :param columns:     Feature columns (see tree.to_columns)
+    :param max_bytes:   If set, maximum number of bytes of intermediate outputs
+                        kept at the same time. When exceeded, the least recently
+                        used outputs are discarded and recomputed if needed
+    """
+
+    def __init__(self, columns, max_bytes=None):
+        self.columns = columns
+        self.max_bytes = max_bytes
+        self.table = {}
+        self.keys = []
+        self.uses = []
+        self.outputs = OrderedDict()
+        self.output_bytes = 0
+
+
+    def add(self, values):
+        """
+        Adds a tree to the graph and returns the index of its root node.
+        :param values:  The values of the nodes of the tree in prefix order
+        """
+        stack = []
+        for value in reversed(values):
+            if hasattr(value, '__call__'):
+                left = stack.pop()
+                key = (value, left, stack.pop())
+            elif isinstance(value, str):
+                key = ('variable', int(value))
+            else:
+                key = ('constant', value)
+            index = self.table.get(key)
+            if index is None:
+                index = self.table[key] = len(self.keys)
+                self.keys.append(key)
+                self.uses.append(0)
+                if len(key) == 3:
+                    self.uses[key[1]] += 1
+                    self.uses[key[2]] += 1
+            stack.append(index)
+        return stack[0]
+
+
+    def evaluate(self, trees):
+        """
+        Yields the predictions of each tree (NumPy arrays of shape [n_samples]),
+        in the order of the trees.
+        :param trees:   The trees to evaluate
+        """
+        roots = [self.add(tree.prefix()) for tree in trees]
+        for root in roots:
+            self.uses[root] += 1
+        evaluated = 0
+        for root in roots:
+            while evaluated <= root:
+                self.compute(evaluated)
+                evaluated += 1
+            output = self.output(root)
+            self.release(root)
+            if np.ndim(output) == 0:
+                yield np.full(self.columns.shape[1], output, dtype=float)
+            else:
+                yield np.asarray(output, dtype=float)
+
+
+    def compute(self, index):
+        """
+        Computes the output of a node of the graph and keeps it while it is
+        used by other nodes.
+        :param index:   The index of the node
+        """
+        key = self.keys[index]
+        if len(key) != 3:
+            return
+        output = key[0](self.output(key[1]), self.output(key[2]))
+        self.release(key[1])
+        self.release(key[2])
+        if self.uses[index] > 0:
+            self.outputs[index] = output
+            self.output_bytes += getattr(output, 'nbytes', 0)
+            while self.max_bytes is not None and len(self.outputs) > 1 and \
+                self.output_bytes > self.max_bytes:
+                self.output_bytes -= getattr(self.outputs.popitem(last=False)[1],
+                                            'nbytes', 0)
+
+
+    def output(self, index):
+        """
+        Returns the output of a node, recomputing it if it was discarded.
+        :param index:   The index of the node
+        """
+        key = self.keys[index]
+        if key[0] == 'variable':
+            return self.columns[key[1]]
+        elif key[0] == 'constant':
+            return key[1]
+        elif index in self.outputs:
+            self.outputs.move_to_end(index)
+            return self.outputs[index]
+        target = index
+        results = {}
+        stack = [(index, False)]
+        while stack:
+            index, visited = stack.pop()
+            key = self.keys[index]
+            if index in results:
+                continue
+            elif len(key) != 3 or index in self.outputs:
+                results[index] = self.output(index)
+            elif not visited:
+                stack.append((index, True))
+                stack.append((key[2], False))
+                stack.append((key[1], False))
+            else:
+                results[index] = key[0](results[key[1]], results[key[2]])
+        return results[target]
+
+
+    def release(self, index):
+        """
+        Records that a user of the output of a node was evaluated, discarding
+        the output when it is no longer needed.
+        :param index:   The index of the node
+        """
+        self.uses[index] -= 1
+        if self.uses[index] == 0 and index in self.outputs:
+            self.output_bytes -= getattr(self.outputs.pop(index), 'nbytes', 0)
@@ -0,0 +1,144 @@
+from .tree import to_columns
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ChunkedDataset(object):
+    """
+    Training set read chunk by chunk, for datasets that do not fit in memory.
+    Each chunk is converted to feature columns (see to_columns) when it is read,
+    so only one chunk is loaded at a time.
+    :param features:    NumPy array or memmap of shape [n_samples, n_features],
+                        or path of a .npy file (opened as a memmap)
+    :param targets:     NumPy array or memmap of shape [n_samples], or path of
+                        a .npy file
+    :param chunk_size:  Number of examples of each chunk
+    :param chunks:      Instead of features and targets, a function returning
+                        an iterable of (features, targets) chunks. It is called
+                        each time the dataset is read
+    """
+
+    def __init__(self, features=None, targets=None, chunk_size=65536,
+                chunks=None):
+        if np is None:
+            raise ImportError('NumPy is required for chunked datasets')
+        if chunks is None:
+            if isinstance(features, str):
+                features = np.load(features, mmap_mode='r')
+            if isinstance(targets, str):
+                targets = np.load(targets, mmap_mode='r')
+            if features is None or targets is None or \
+                len(features) == 0 or len(features) != len(targets):
+                raise AttributeError('Invalid features or targets')
+        self.features = features
+        self.targets = targets
+        self.chunk_size = chunk_size
+        self.chunk_function = chunks
+
+
+    @property
+    def n_features(self):
+        """
+        The number of features of the examples.
+        """
+        if self.chunk_function is None:
+            return self.features.shape[1]
+        for features, targets in self.chunk_function():
+            return np.shape(features)[1]
+        raise AttributeError('Empty dataset')
+
+
+    def chunks(self):
+        """
+        Yields the chunks of the dataset as (feature columns, targets) pairs of
+        NumPy arrays.
+        """
+        if self.chunk_function is None:
+            for start in range(0, len(self.targets), self.chunk_size):
+                end = start + self.chunk_size
+                yield (to_columns(self.features[start:end]),
+                        np.asarray(self.targets[start:end], dtype=float))
+        else:
+            for features, targets in self.chunk_function():
+                yield to_columns(features), np.asarray(targets, dtype=float)
+
+
+class StreamingFitness(object):
+    """
+    Base class of the fitness functions used with chunked datasets. The fitness
+    of a tree is accumulated chunk by chunk: start returns an initial state,
+    update is called with the predictions of the tree on each chunk and
+    finish computes the fitness from the final state.
+    A StreamingFitness can also be used as the fitness function of a vectorized
+    algorithm trained on data in memory.
+    """
+
+    def __call__(self, tree, predictions, targets):
+        return self.finish(self.update(self.start(tree), predictions, targets),
+                            tree)
+
+
+    def start(self, tree):
+        """
+        Returns the initial state of the evaluation of a tree.
+        :param tree:    The evaluated tree
+        """
+        raise NotImplementedError()
+
+
+    def update(self, state, predictions, targets):
+        """
+        Returns the state updated with the predictions on a chunk.
+        :param state:       The current state
+        :param predictions: The predictions of the tree on the chunk
+        :param targets:     The target values of the chunk
+        """
+        raise NotImplementedError()
+
+
+    def finish(self, state, tree):
+        """
+        Returns the fitness of a tree from the final state.
+        :param state:   The final state
+        :param tree:    The evaluated tree
+        """
+        raise NotImplementedError()
+
+
+class MeanAbsoluteError(StreamingFitness):
+    """
+    Fitness equal to the opposite of the mean absolute error of the tree.
+    """
+
+    def start(self, tree):
+        return (0.0, 0)
+
+
+    def update(self, state, predictions, targets):
+        return (state[0] + float(np.sum(np.abs(predictions - targets))),
+                state[1] + len(targets))
+
+
+    def finish(self, state, tree):
+        return -state[0] / state[1]
+
+
+class MeanSquaredError(StreamingFitness):
+    """
+    Fitness equal to the opposite of the mean squared error of the tree.
+    """
+
+    def start(self, tree):
+        return (0.0, 0)
+
+
+    def update(self, state, predictions, targets):
+        return (state[0] + float(np.sum((predictions - targets) ** 2)),
+                state[1] + len(targets))
+
+
+    def finish(self, state, tree):
+        return -state[0] / state[1]
@@ -0,0 +1,29 @@
+"""
+Functions that can be used in the trees. They work both on scalars (when the
+trees are evaluated row by row) and on NumPy arrays (when the trees are
+evaluated on whole feature columns with Tree.predict_batch).
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _is_array(*values):
+    return np is not None and any(isinstance(v, np.ndarray) for v in values)
+
+
+def add(a, b): return a + b
+def sub(a, b): return a - b
+def mul(a, b): return a * b
+
+
+def div(a, b):
+    """
+    Protected division: returns 1 when the denominator is zero.
+    """
+    if _is_array(a, b):
+        zero = b == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(zero, 1, a / np.where(zero, 1, b))
+    return a / b if b != 0 else 1
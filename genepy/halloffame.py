@@ -0,0 +1,77 @@
+class HallOfFame(object):
+    """
+    Keeps the best distinct individuals seen during a training run, so the
+    best tree is not lost when it disappears from the population. Individuals
+    are distinct if they have different structures (see Tree.structural_key),
+    and are stored as copies.
+    :param size:    Maximum number of individuals kept
+    """
+
+    def __init__(self, size=1):
+        if size < 1:
+            raise AttributeError('Hall of fame size must be at least 1')
+        self.size = size
+        self.entries = []
+        self.keys = set()
+
+
+    def update(self, trees, fitness):
+        """
+        Adds the individuals of a generation that are better than the worst
+        individual kept.
+        :param trees:   The individuals of the generation
+        :param fitness: Their fitness
+        """
+        # All the individuals are considered, so copies of the best ones do not
+        # leave out the next distinct individuals
+        for index in sorted(range(len(trees)), key=fitness.__getitem__,
+                            reverse=True):
+            fit = fitness[index]
+            if len(self.entries) == self.size and not fit > self.entries[-1][0]:
+                break
+            key = trees[index].structural_key()
+            if key in self.keys:
+                continue
+            if len(self.entries) == self.size:
+                self.keys.discard(self.entries.pop()[2])
+            self.entries.append((fit, trees[index].copy(), key))
+            self.entries.sort(key=lambda entry: entry[0], reverse=True)
+            self.keys.add(key)
+
+
+    def clear(self):
+        """
+        Removes all the individuals.
+        """
+        self.entries = []
+        self.keys = set()
+
+
+    @property
+    def best(self):
+        """
+        The best individual seen.
+        """
+        if not self.entries:
+            raise ValueError('Empty hall of fame')
+        return self.entries[0][1]
+
+
+    @property
+    def trees(self):
+        """
+        The individuals kept, from the best to the worst.
+        """
+        return [entry[1] for entry in self.entries]
+
+
+    @property
+    def fitness(self):
+        """
+        The fitness of the individuals kept, from the best to the worst.
+        """
+        return [entry[0] for entry in self.entries]
+
+
+    def __len__(self):
+        return len(self.entries)
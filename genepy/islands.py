@@ -0,0 +1,127 @@
+import heapq
+import random
+import multiprocessing
+from .parallel import dump_tree, load_tree
+from .halloffame import HallOfFame
+
+
+TOPOLOGIES = ['ring', 'fully_connected', 'random']
+
+
+def migration_generations(iterations, interval):
+    """
+    Returns the generations after whose evaluation individuals migrate.
+    :param iterations:  The number of generations of the run
+    :param interval:    The number of generations between two migrations
+    """
+    return [g for g in range(interval - 1, iterations - 1, interval)]
+
+
+def route_migrants(emigrants, topology, rng=random):
+    """
+    Returns the individuals received by each island.
+    :param emigrants:   For each island, the (serialized tree, fitness) pairs of
+                        the individuals it sends
+    :param topology:    'ring' (each island receives the individuals of the
+                        previous one), 'fully_connected' (each island receives
+                        the best individuals sent by all the other islands) or
+                        'random' (each island receives the individuals of
+                        another island chosen randomly)
+    :param rng:         The random generator used by the 'random' topology
+    """
+    n = len(emigrants)
+    if topology == 'ring':
+        return [emigrants[i - 1] for i in range(n)]
+    elif topology == 'fully_connected':
+        return [heapq.nlargest(len(emigrants[i]),
+                                [migrant for j in range(n) if j != i
+                                for migrant in emigrants[j]],
+                                key=lambda migrant: migrant[1])
+                for i in range(n)]
+    return [emigrants[rng.choice([j for j in range(n) if j != i])]
+            for i in range(n)]
+
+
+def _run_island(ea, island, conn, features, targets, iterations):
+    if ea.seed is not None:
+        random.seed('{}-island-{}'.format(ea.seed, island))
+    if ea.fitness_cache is not None:
+        ea.fitness_cache.clear()
+    ea.worst_fitness = None
+    variables, features, targets = ea.prepare_data(features, targets)
+    data = ea.optimization_data(features, targets)
+    migrations = set(migration_generations(iterations, ea.migration_interval))
+    trees = ea.create_trees(variables)
+    hall_of_fame = HallOfFame(ea.hall_of_fame.size)
+    for generation in range(iterations):
+        fitness = ea.evaluate(trees, features, targets)
+        ea.optimize_constants(trees, fitness, generation, data, features,
+                                targets)
+        hall_of_fame.update(trees, fitness)
+        if generation in migrations:
+            best = heapq.nlargest(ea.migration_size, range(len(trees)),
+                                key=fitness.__getitem__)
+            conn.send([(dump_tree(trees[i], ea.functions), fitness[i])
+                        for i in best])
+            immigrants = conn.recv()
+            worst = heapq.nsmallest(len(immigrants), range(len(trees)),
+                                    key=fitness.__getitem__)
+            for i, (tree_data, fit) in zip(worst, immigrants):
+                trees[i] = load_tree(tree_data, ea.functions, ea.tree_class)
+                fitness[i] = fit
+        trees = ea.selection(trees, fitness)
+        trees = ea.generate_next_population(trees, variables,
+                                ea.tree_evaluator(features, targets))
+        ea.simplify_trees(trees, generation)
+    hall_of_fame.update(trees, ea.evaluate(trees, features, targets))
+    conn.send([(dump_tree(tree, ea.functions), fit)
+                for tree, fit in zip(hall_of_fame.trees, hall_of_fame.fitness)])
+    conn.close()
+
+
+def run_islands(ea, features, targets, iterations):
+    """
+    Runs ea.n_islands independent populations of ea.nb_trees individuals in
+    separate processes. Every ea.migration_interval generations, each island
+    sends its ea.migration_size best individuals, which replace the worst
+    individuals of the islands receiving them (see route_migrants). The best
+    individuals of all the islands are kept in ea.hall_of_fame, and the best
+    of them is returned.
+    :param ea:          The EvolutionaryAlgorithm holding the parameters
+    :param features:    Training examples
+    :param targets:     Target values
+    :param iterations:  Number of generations of each island
+    """
+    rng = random.Random(ea.seed)
+    connections = []
+    processes = []
+    try:
+        for island in range(ea.n_islands):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_run_island,
+                                            args=(ea, island, child_conn,
+                                                features, targets, iterations))
+            process.daemon = True
+            process.start()
+            child_conn.close()
+            connections.append(parent_conn)
+            processes.append(process)
+        for _ in migration_generations(iterations, ea.migration_interval):
+            emigrants = [conn.recv() for conn in connections]
+            for conn, immigrants in zip(connections,
+                                        route_migrants(emigrants, ea.topology,
+                                                        rng)):
+                conn.send(immigrants)
+        results = [conn.recv() for conn in connections]
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    ea.hall_of_fame.clear()
+    for entries in results:
+        ea.hall_of_fame.update([load_tree(data, ea.functions, ea.tree_class)
+                                for data, fit in entries],
+                                [fit for data, fit in entries])
+    return ea.hall_of_fame.best.copy()
@@ -0,0 +1,405 @@
+import random
+from array import array
+from itertools import islice
+from .tree import Tree, to_columns
+from .simplify import simplify_prefix
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+"""
+Opcodes of the leaves. Opcodes of functions are their indexes in the function
+table of the tree.
+"""
+VARIABLE = -1
+CONSTANT = -2
+
+
+def array_bytes(values):
+    """
+    Returns the content of an array as bytes (array.tobytes does not exist
+    before Python 3.2).
+    :param values:  The array
+    """
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()
+
+
+class LinearTree(object):
+    """
+    Represents a regression tree as flat arrays in prefix order. It is a more
+    compact alternative to Tree: each node takes a few bytes, copying a tree
+    copies three arrays, subtrees are contiguous slices (so crossover and
+    mutations are slice splices) and the tree is evaluated with a stack
+    instead of recursive calls.
+    Takes the same parameters as Tree. All the trees of a population must share
+    the same functions list.
+
+    The nodes are stored in three arrays:
+    - opcodes:  index of the function in self.functions, VARIABLE or CONSTANT
+    - operands: index of the variable or value of the constant
+    - extents:  index following the last node of the subtree of each node
+    """
+
+    __slots__ = ('functions', 'opcodes', 'operands', 'extents', 'max_depth',
+                'construction_method')
+
+    def __init__(self, max_depth, max_const, function_ratio, variable_ratio,
+                functions, variables, construction_method='grow'):
+        if not construction_method in ['grow','full']:
+            raise AttributeError('Construction method must be either grow or full')
+        self.functions = functions
+        self.max_depth = max_depth
+        self.construction_method = construction_method
+        self.opcodes = array('h')
+        self.operands = array('d')
+        depths = [max_depth]
+        while depths:
+            depth = depths.pop()
+            if depth > 1 and (construction_method == 'full' or
+                depth == max_depth or random.random() <= function_ratio):
+                self.opcodes.append(random.randrange(len(functions)))
+                self.operands.append(0)
+                depths.extend((depth - 1, depth - 1))
+            elif random.random() <= variable_ratio:
+                self.opcodes.append(VARIABLE)
+                self.operands.append(int(random.choice(variables)))
+            else:
+                self.opcodes.append(CONSTANT)
+                self.operands.append(random.choice(range(max_const)))
+        self.update_extents()
+
+
+    @classmethod
+    def from_prefix(cls, values, functions, construction_method='grow'):
+        """
+        Builds a tree from the values of its nodes listed in prefix order, using
+        the same conventions as Node.value.
+        :param values:              The values of the nodes
+        :param functions:           The function table of the tree
+        :param construction_method: The construction method to record
+        """
+        tree = cls.__new__(cls)
+        tree.functions = functions
+        tree.construction_method = construction_method
+        tree.opcodes, tree.operands = tree.encode(values)
+        tree.update_extents()
+        if tree.extents[0] != len(tree.opcodes):
+            raise ValueError('Invalid prefix: too many values')
+        tree.max_depth = tree.depth()
+        return tree
+
+
+    @classmethod
+    def from_arrays(cls, opcodes, operands, functions,
+                    construction_method='grow'):
+        """
+        Builds a tree from its opcodes and operands arrays (or their bytes).
+        :param opcodes:             The opcodes of the nodes
+        :param operands:            The operands of the nodes
+        :param functions:           The function table of the tree
+        :param construction_method: The construction method to record
+        """
+        tree = cls.__new__(cls)
+        tree.functions = functions
+        tree.construction_method = construction_method
+        # Bytes are decoded by the array constructor on every Python version
+        tree.opcodes = array('h', opcodes)
+        tree.operands = array('d', operands)
+        if len(tree.opcodes) != len(tree.operands):
+            raise ValueError('Opcodes and operands must have the same length')
+        tree.update_extents()
+        tree.max_depth = tree.depth()
+        return tree
+
+
+    @classmethod
+    def from_tree(cls, tree, functions):
+        """
+        Converts a Tree to a LinearTree.
+        :param tree:        The tree to convert
+        :param functions:   The function table of the tree
+        """
+        return cls.from_prefix(tree.prefix(), functions, tree.construction_method)
+
+
+    def to_tree(self):
+        """
+        Converts this tree to a Tree.
+        """
+        return Tree.from_prefix(self.prefix(), self.construction_method)
+
+
+    def encode(self, values):
+        """
+        Returns the opcodes and operands arrays encoding the given node values.
+        :param values:  The values of the nodes (see Node.value)
+        """
+        opcodes = array('h')
+        operands = array('d')
+        for value in values:
+            if hasattr(value, '__call__'):
+                opcodes.append(self.functions.index(value))
+                operands.append(0)
+            elif isinstance(value, str):
+                opcodes.append(VARIABLE)
+                operands.append(int(value))
+            else:
+                opcodes.append(CONSTANT)
+                operands.append(value)
+        return opcodes, operands
+
+
+    def value_at(self, index):
+        """
+        Returns the value of a node, using the same conventions as Node.value.
+        :param index:   The index of the node
+        """
+        opcode = self.opcodes[index]
+        operand = self.operands[index]
+        if opcode >= 0:
+            return self.functions[opcode]
+        elif opcode == VARIABLE:
+            return str(int(operand))
+        return int(operand) if operand.is_integer() else operand
+
+
+    def set_value(self, index, value):
+        """
+        Replaces the value of a node by another value of the same kind (function
+        or leaf).
+        :param index:   The index of the node
+        :param value:   The new value (see Node.value)
+        """
+        opcodes, operands = self.encode([value])
+        if (opcodes[0] >= 0) != (self.opcodes[index] >= 0):
+            raise ValueError('Cannot change the kind of a node')
+        self.opcodes[index] = opcodes[0]
+        self.operands[index] = operands[0]
+
+
+    def prefix(self):
+        """
+        Returns the values of the nodes of the tree in prefix order.
+        """
+        return [self.value_at(i) for i in range(len(self.opcodes))]
+
+
+    def constants(self):
+        """
+        Returns the values of the constant nodes of the tree in prefix order.
+        """
+        return [self.value_at(i) for i in range(len(self.opcodes))
+                if self.opcodes[i] == CONSTANT]
+
+
+    def set_constants(self, values):
+        """
+        Replaces the values of the constant nodes of the tree.
+        :param values:  The new values, in prefix order (see constants)
+        """
+        values = iter(values)
+        for i in range(len(self.opcodes)):
+            if self.opcodes[i] == CONSTANT:
+                self.operands[i] = next(values)
+
+
+    def structural_key(self):
+        """
+        Returns a hashable key identifying the structure of the tree (see
+        Tree.structural_key).
+        """
+        return array_bytes(self.opcodes) + array_bytes(self.operands)
+
+
+    def structural_hash(self):
+        """
+        Returns a hash of the structure of the tree.
+        """
+        return hash(self.structural_key())
+
+
+    def update_extents(self):
+        """
+        Recomputes the extents of the subtrees after the opcodes changed.
+        """
+        opcodes = self.opcodes
+        extents = array('i', [0]) * len(opcodes)
+        for i in range(len(opcodes) - 1, -1, -1):
+            if opcodes[i] >= 0:
+                extents[i] = extents[extents[i + 1]]
+            else:
+                extents[i] = i + 1
+        self.extents = extents
+
+
+    def simplify(self):
+        """
+        Folds the subtrees without variables and applies the algebraic
+        identities of the known operators (see simplify_prefix).
+        """
+        values = simplify_prefix(self.prefix())
+        if len(values) < len(self):
+            self.opcodes, self.operands = self.encode(values)
+            self.update_extents()
+
+
+    def depth(self):
+        """
+        Returns the depth of the tree.
+        """
+        return self.subtree_height(0)
+
+
+    def node_depth(self, index):
+        """
+        Returns the depth of a node (1 for the root node).
+        :param index:   The index of the node
+        """
+        opcodes = self.opcodes
+        extents = self.extents
+        return 1 + sum(1 for i in range(index)
+                        if opcodes[i] >= 0 and extents[i] > index)
+
+
+    def subtree_size(self, index):
+        """
+        Returns the number of nodes of the subtree starting at a node.
+        :param index:   The index of the node
+        """
+        return self.extents[index] - index
+
+
+    def subtree_height(self, index):
+        """
+        Returns the depth of the subtree starting at a node.
+        :param index:   The index of the node
+        """
+        opcodes = self.opcodes
+        extents = self.extents
+        end = extents[index]
+        heights = [1] * (end - index)
+        for i in range(end - 1, index - 1, -1):
+            if opcodes[i] >= 0:
+                heights[i - index] += max(heights[i + 1 - index],
+                                        heights[extents[i + 1] - index])
+        return heights[0]
+
+
+    def predict(self, feature):
+        """
+        Predicts an output for the given inputs. Can also be called with feature
+        columns (NumPy arrays) to evaluate many inputs at once.
+        """
+        functions = self.functions
+        opcodes = self.opcodes
+        operands = self.operands
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        for i in range(len(opcodes) - 1, -1, -1):
+            opcode = opcodes[i]
+            if opcode >= 0:
+                left = pop()
+                push(functions[opcode](left, pop()))
+            elif opcode == VARIABLE:
+                push(feature[int(operands[i])])
+            else:
+                push(operands[i])
+        return stack[0]
+
+
+    def predict_batch(self, features):
+        """
+        Predicts the outputs for a whole set of inputs at once.
+        :param features:    Inputs for prediction (array-like / matrix object of
+                            shape [n_samples, n_features])
+        """
+        return self.predict_columns(to_columns(features))
+
+
+    def predict_columns(self, columns):
+        """
+        Predicts the outputs for inputs already converted with to_columns.
+        :param columns: NumPy array of shape [n_features, n_samples]
+        """
+        output = self.predict(columns)
+        if np.ndim(output) == 0:
+            return np.full(columns.shape[1], output, dtype=float)
+        return np.asarray(output, dtype=float)
+
+
+    def pick_random_node(self, content=None):
+        """
+        Returns the index of a node randomly chosen in the tree, excluding the
+        root node.
+        :param content: The type of content held in the node. Can be set to
+                        None if any node can be chosen, 'function' is the
+                        node must contain a function and 'value' for a const
+                        or a variable
+        """
+        if content is None:
+            return random.randrange(1, len(self.opcodes))
+        function = content == 'function'
+        return random.choice([i for i in range(1, len(self.opcodes))
+                            if (self.opcodes[i] >= 0) == function])
+
+
+    def has_function_node(self):
+        """
+        Returns True if the tree contains at least one node with a function
+        and this node is not the root node.
+        """
+        return any(opcode >= 0 for opcode in islice(self.opcodes, 1, None))
+
+
+    def subtree(self, index):
+        """
+        Returns the opcodes and operands of the subtree starting at a node.
+        :param index:   The index of the root of the subtree
+        """
+        end = self.extents[index]
+        return self.opcodes[index:end], self.operands[index:end]
+
+
+    def replace_subtree(self, index, opcodes, operands):
+        """
+        Replaces the subtree starting at a node by another one.
+        :param index:       The index of the root of the subtree to replace
+        :param opcodes:     The opcodes of the new subtree
+        :param operands:    The operands of the new subtree
+        """
+        end = self.extents[index]
+        self.opcodes[index:end] = opcodes
+        self.operands[index:end] = operands
+        self.update_extents()
+
+
+    def copy(self):
+        """
+        Returns a copy of the tree, sharing only the function table.
+        """
+        tree = type(self).__new__(type(self))
+        tree.functions = self.functions
+        tree.opcodes = self.opcodes[:]
+        tree.operands = self.operands[:]
+        tree.extents = self.extents[:]
+        tree.max_depth = self.max_depth
+        tree.construction_method = self.construction_method
+        return tree
+
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+
+    def __len__(self):
+        return len(self.opcodes)
+
+
+    def __repr__(self):
+        return repr(self.to_tree())
@@ -1,15 +1,24 @@
-class Node:
+import numbers
+
+
+class Node(object):
     """
     Represents a node / leaf in a tree.
     :param value:       The value that this node holds
     :param prev_node:   The previous node in the tree
+
+    The output attribute can hold the output of the node on a set of feature
+    columns, as a (columns, output) tuple (see Tree.predict_columns).
     """
 
+    __slots__ = ('value', 'prev', 'next_left', 'next_right', 'output')
+
     def __init__(self, value, prev_node):
         self.value = value
         self.prev = prev_node
         self.next_left = None
         self.next_right = None
+        self.output = None
 
 
     def set_children(self, left, right):
@@ -27,9 +36,10 @@ class Node:
         Calculates the output of this node. If the node is a leaf,
         returns self.value; otherwise returns the result of the function contained
         in self.value called with the results from the children.
-        :param variables:   The variables that can be used in the tree
+        :param feature: The input features. Can also be a sequence of feature
+                        columns (NumPy arrays) to evaluate many inputs at once
         """
-        if isinstance(self.value, int):
+        if isinstance(self.value, numbers.Number):
             return self.value
         elif isinstance(self.value, str):
             return feature[int(self.value)]
@@ -42,7 +52,7 @@ class Node:
     def __repr__(self):
         if isinstance(self.value, str):
             return 'Variable: {}'.format(self.value)
-        elif isinstance(self.value, int):
+        elif isinstance(self.value, numbers.Number):
             return 'Constant: {}'.format(self.value)
         else:
             return 'Function: {}'.format(self.value)
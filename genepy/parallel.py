@@ -0,0 +1,124 @@
+import random
+import multiprocessing
+from .linear import LinearTree, array_bytes
+from .sampling import sample_indices, take
+
+
+"""
+State of a worker process, set once when the process starts.
+"""
+_worker = {}
+
+
+def dump_tree(tree, functions):
+    """
+    Returns a compact representation of a tree (Tree or LinearTree): the bytes
+    of its opcodes and operands in prefix order.
+    :param tree:        The tree to serialize
+    :param functions:   The function table used to encode the functions
+    """
+    if not isinstance(tree, LinearTree):
+        tree = LinearTree.from_tree(tree, functions)
+    return array_bytes(tree.opcodes), array_bytes(tree.operands)
+
+
+def load_tree(data, functions, tree_class):
+    """
+    Rebuilds a tree serialized with dump_tree.
+    :param data:        The serialized tree
+    :param functions:   The function table used to encode the functions
+    :param tree_class:  The class of the tree to build (Tree or LinearTree)
+    """
+    tree = LinearTree.from_arrays(data[0], data[1], functions)
+    if tree_class is LinearTree:
+        return tree
+    return tree.to_tree()
+
+
+def _init_worker(fitness, functions, tree_class, vectorized, features, targets,
+                seed):
+    _worker.update(fitness=fitness, functions=functions, tree_class=tree_class,
+                    vectorized=vectorized, features=features, targets=targets,
+                    seed=seed)
+
+
+def _sample_data(sample):
+    if sample is None:
+        return _worker['features'], _worker['targets']
+    if _worker.get('sample') != sample:
+        _worker['sample'] = sample
+        _worker['sample_data'] = take(_worker['features'], _worker['targets'],
+                                    sample_indices(sample), _worker['vectorized'])
+    return _worker['sample_data']
+
+
+def _evaluate(task):
+    generation, index, data, sample = task
+    if _worker['seed'] is not None:
+        random.seed('{}-{}-{}'.format(_worker['seed'], generation, index))
+    tree = load_tree(data, _worker['functions'], _worker['tree_class'])
+    features, targets = _sample_data(sample)
+    if _worker['vectorized']:
+        features = tree.predict_columns(features)
+    return _worker['fitness'](tree, features, targets)
+
+
+class FitnessPool(object):
+    """
+    Pool of processes evaluating the fitness of the trees. The training data is
+    sent to each process only once, when it starts (with the 'fork' start
+    method it is simply inherited), and the trees are sent in the compact form
+    of dump_tree.
+    :param n_jobs:      Number of processes (-1 to use all the CPUs)
+    :param fitness:     The fitness function
+    :param functions:   The functions that can be used in the trees
+    :param tree_class:  The class of the trees (Tree or LinearTree)
+    :param vectorized:  True if the fitness function receives predictions
+    :param features:    Training examples (feature columns if vectorized)
+    :param targets:     Target values
+    :param seed:        If set, the random module is seeded before each
+                        evaluation with a value depending on this seed, the
+                        generation and the index of the tree, so results do
+                        not depend on the scheduling of the tasks
+    """
+
+    def __init__(self, n_jobs, fitness, functions, tree_class, vectorized,
+                features, targets, seed=None):
+        if n_jobs is None or n_jobs < 0:
+            n_jobs = multiprocessing.cpu_count()
+        self.n_jobs = n_jobs
+        self.functions = functions
+        self.generation = 0
+        self.sample = None
+        self.pool = multiprocessing.Pool(n_jobs, _init_worker,
+                                        (fitness, functions, tree_class,
+                                        vectorized, features, targets, seed))
+
+
+    def set_sample(self, sample):
+        """
+        Sets the subset of the training data used by the following evaluations.
+        :param sample:  A sample returned by Sampler.next, or None to use the
+                        whole training set
+        """
+        self.sample = sample
+
+
+    def evaluate(self, trees):
+        """
+        Returns the fitness of each tree, in the order of the trees.
+        :param trees:   The trees to evaluate
+        """
+        tasks = [(self.generation, i, dump_tree(tree, self.functions),
+                self.sample) for i, tree in enumerate(trees)]
+        self.generation += 1
+        chunksize = max(1, len(tasks) // (4 * self.n_jobs))
+        return self.pool.map(_evaluate, tasks, chunksize)
+
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        self.pool.close()
+        self.pool.join()
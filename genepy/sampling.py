@@ -0,0 +1,78 @@
+import random
+
+
+SAMPLING_METHODS = ['minibatch', 'progressive']
+
+
+def sample_indices(sample):
+    """
+    Returns the sorted indexes of the examples of a sample.
+    :param sample:  A (n_samples, size, seed) tuple returned by Sampler.next
+    """
+    n_samples, size, seed = sample
+    return sorted(random.Random(seed).sample(range(n_samples), size))
+
+
+def take(features, targets, indices, columns=False):
+    """
+    Returns the examples and target values at the given indexes.
+    :param features:    Training examples, or feature columns if columns is True
+    :param targets:     Target values
+    :param indices:     The indexes of the examples to keep
+    :param columns:     True if features and targets are NumPy arrays and
+                        features is made of feature columns (see to_columns)
+    """
+    if columns:
+        return features[:, indices], targets[indices]
+    return [features[i] for i in indices], [targets[i] for i in indices]
+
+
+class Sampler(object):
+    """
+    Chooses the subset of the training set used to evaluate each generation.
+    :param n_samples:   Number of examples in the training set
+    :param size:        Number of examples of each sample
+    :param method:      'minibatch' to draw a new random sample of the same size
+                        at each generation, or 'progressive' to double the size
+                        of the samples each time the best fitness has not
+                        improved for patience generations
+    :param patience:    Number of generations without improvement before the
+                        samples grow, for progressive sampling
+    """
+
+    def __init__(self, n_samples, size, method='minibatch', patience=5):
+        if not method in SAMPLING_METHODS:
+            raise AttributeError('Sampling method must be one of: %s' %
+                                ', '.join(SAMPLING_METHODS))
+        self.n_samples = n_samples
+        self.size = min(size, n_samples)
+        self.method = method
+        self.patience = patience
+        self.best = None
+        self.stagnation = 0
+
+
+    def next(self):
+        """
+        Returns the sample of the next generation, as a (n_samples, size, seed)
+        tuple (see sample_indices).
+        """
+        return (self.n_samples, self.size, random.getrandbits(32))
+
+
+    def update(self, best_fitness):
+        """
+        Records the best fitness of the last generation.
+        :param best_fitness:    The best fitness of the last generation
+        """
+        if self.method != 'progressive':
+            return
+        if self.best is None or best_fitness > self.best:
+            self.best = best_fitness
+            self.stagnation = 0
+            return
+        self.stagnation += 1
+        if self.stagnation >= self.patience and self.size < self.n_samples:
+            self.size = min(2 * self.size, self.n_samples)
+            self.best = None
+            self.stagnation = 0
@@ -0,0 +1,111 @@
+import random
+from bisect import bisect_right
+
+
+def cumulative_weights(weights):
+    """
+    Returns the cumulative sums of a list of non-negative weights.
+    :param weights: The weights
+    """
+    total = 0.0
+    cumulative = []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def sample_cumulative(cumulative, n):
+    """
+    Draws n indexes with probability proportional to the weights whose
+    cumulative sums are given. Each draw is a binary search. If all the weights
+    are zero, the indexes are drawn uniformly.
+    :param cumulative:  The cumulative sums of the weights
+    :param n:           The number of indexes to draw
+    """
+    total = cumulative[-1]
+    if total <= 0:
+        return [random.randrange(len(cumulative)) for _ in range(n)]
+    last = len(cumulative) - 1
+    return [min(bisect_right(cumulative, random.random() * total), last)
+            for _ in range(n)]
+
+
+class RouletteSelection(object):
+    """
+    Selects individuals with probability proportional to their fitness. If
+    some fitness values are negative, all values are shifted so that the
+    worst individual has a zero probability.
+    """
+
+    def select(self, fitness, n):
+        """
+        Returns the indexes of n selected individuals.
+        :param fitness: The fitness of the population
+        :param n:       The number of individuals to select
+        """
+        lowest = min(fitness)
+        shift = lowest if lowest < 0 else 0
+        return sample_cumulative(cumulative_weights(fit - shift
+                                                    for fit in fitness), n)
+
+
+class MixedSelection(RouletteSelection):
+    """
+    Selects half of the individuals uniformly and the other half with
+    probability proportional to their fitness (see RouletteSelection).
+    """
+
+    def select(self, fitness, n):
+        roulette = iter(RouletteSelection.select(self, fitness, n // 2))
+        return [random.randrange(len(fitness)) if i % 2 == 0 else next(roulette)
+                for i in range(n)]
+
+
+class RankSelection(object):
+    """
+    Selects individuals with probability proportional to their rank in the
+    population (1 for the worst individual, n for the best one), which does
+    not depend on the scale of the fitness values.
+    """
+
+    def select(self, fitness, n):
+        order = sorted(range(len(fitness)), key=fitness.__getitem__)
+        selected = sample_cumulative(cumulative_weights(range(1, len(order) + 1)),
+                                    n)
+        return [order[rank] for rank in selected]
+
+
+class TournamentSelection(object):
+    """
+    Selects each individual as the best of a few individuals drawn uniformly.
+    :param size:    The number of individuals taking part in each tournament
+    """
+
+    def __init__(self, size=3):
+        if size < 1:
+            raise AttributeError('Tournament size must be at least 1')
+        self.size = size
+
+
+    def select(self, fitness, n):
+        selected = []
+        for _ in range(n):
+            best = random.randrange(len(fitness))
+            for _ in range(self.size - 1):
+                challenger = random.randrange(len(fitness))
+                if fitness[challenger] > fitness[best]:
+                    best = challenger
+            selected.append(best)
+        return selected
+
+
+"""
+Selection methods that can be given by name to EvolutionaryAlgorithm.
+"""
+SELECTION_METHODS = {
+    'mixed':        MixedSelection,
+    'roulette':     RouletteSelection,
+    'rank':         RankSelection,
+    'tournament':   TournamentSelection,
+}
@@ -0,0 +1,104 @@
+import math
+import numbers
+import operator
+from . import functions
+
+
+"""
+Operators whose algebraic identities are known, by name of the operation.
+"""
+KNOWN_OPERATORS = {
+    functions.add:  'add',
+    functions.sub:  'sub',
+    functions.mul:  'mul',
+    functions.div:  'div',
+    operator.add:   'add',
+    operator.sub:   'sub',
+    operator.mul:   'mul',
+}
+
+
+def is_constant(value):
+    """
+    Returns True if a node value is a constant.
+    :param value:   The value of the node (see Node.value)
+    """
+    return isinstance(value, numbers.Number)
+
+
+def fold(function, left, right):
+    """
+    Returns the value of a function applied to two constants, or None if it
+    cannot be represented by a constant node (error, non-finite or non-real
+    result).
+    :param function:    The function of the node
+    :param left:        The left constant
+    :param right:       The right constant
+    """
+    try:
+        value = function(left, right)
+        if hasattr(value, 'item'):
+            value = value.item()
+        if not isinstance(value, numbers.Real) or math.isinf(value) or \
+            math.isnan(value):
+            return None
+    except Exception:
+        # Includes the OverflowError of math.isinf on integers too large for
+        # a float
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53:
+        return int(value)
+    return value
+
+
+def simplify_node(function, left, right):
+    """
+    Returns the simplified prefix values of a function node, given the
+    simplified prefix values of its children.
+    :param function:    The function of the node
+    :param left:        The values of the left subtree
+    :param right:       The values of the right subtree
+    """
+    if len(left) == 1 and len(right) == 1 and \
+        is_constant(left[0]) and is_constant(right[0]):
+        value = fold(function, left[0], right[0])
+        if value is not None:
+            return [value]
+    name = KNOWN_OPERATORS.get(function)
+    left_value = left[0] if len(left) == 1 and is_constant(left[0]) else None
+    right_value = right[0] if len(right) == 1 and is_constant(right[0]) else None
+    if name == 'add':
+        if left_value == 0: return right
+        if right_value == 0: return left
+    elif name == 'sub':
+        if right_value == 0: return left
+        if left == right: return [0]
+    elif name == 'mul':
+        if left_value == 1: return right
+        if right_value == 1: return left
+        if left_value == 0 or right_value == 0: return [0]
+    elif name == 'div':
+        if right_value == 1: return left
+        if left == right: return [1]
+    return [function] + left + right
+
+
+def simplify_prefix(values):
+    """
+    Returns the values of a simplified tree, in prefix order. Subtrees without
+    variables are replaced by their value (the functions are assumed to be
+    deterministic), and the identities x + 0 = x, x - 0 = x, x - x = 0,
+    x * 1 = x, x * 0 = 0, x / 1 = x and x / x = 1 (protected division) are
+    applied for the known operators, assuming finite inputs.
+    :param values:  The values of the nodes of the tree in prefix order
+    """
+    stack = []
+    for value in reversed(values):
+        if hasattr(value, '__call__'):
+            left = stack.pop()
+            stack.append(simplify_node(value, left, stack.pop()))
+        else:
+            stack.append([value])
+    return stack[0]
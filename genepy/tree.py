@@ -1,8 +1,79 @@
 import random
+import numbers
 from .node import Node
+from .compiler import compile_tree
+from .simplify import simplify_prefix, is_constant
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-class Tree:
+
+def to_columns(features):
+    """
+    Converts training examples to a column-major NumPy array, so that each
+    feature column is contiguous in memory.
+    :param features:    Array-like / matrix object of shape [n_samples, n_features]
+    """
+    if np is None:
+        raise ImportError('NumPy is required for batch evaluation')
+    features = np.asarray(features, dtype=float)
+    if features.ndim != 2:
+        raise ValueError('Features must be of shape [n_samples, n_features]')
+    return np.ascontiguousarray(features.T)
+
+
+class NodeSet(object):
+    """
+    Set of nodes supporting addition, removal and random choice in constant
+    time. The nodes are kept in a list, with a dict giving the position of each
+    node; a removed node is replaced by the last node of the list.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.positions = {}
+
+
+    def add(self, node):
+        self.positions[node] = len(self.items)
+        self.items.append(node)
+
+
+    def remove(self, node):
+        position = self.positions.pop(node)
+        last = self.items.pop()
+        if last is not node:
+            self.items[position] = last
+            self.positions[last] = position
+
+
+    def get(self, index, exclude=None):
+        """
+        Returns the node at a position, skipping the position of exclude.
+        :param index:   The position, between 0 and the number of nodes other
+                        than exclude
+        :param exclude: A node to skip
+        """
+        if exclude in self.positions and index >= self.positions[exclude]:
+            index += 1
+        return self.items[index]
+
+
+    def __contains__(self, node):
+        return node in self.positions
+
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+    def __len__(self):
+        return len(self.items)
+
+
+class Tree(object):
     """
     Represent a regression tree.
     :param max_depth:           Maximum depth of the tree
@@ -22,9 +93,14 @@ class Tree:
                 functions, variables, construction_method='grow'):
         if not construction_method in ['grow','full']:
             raise AttributeError('Construction method must be either grow or full')
-        self.nodes = []
+        self.function_nodes = NodeSet()
+        self.value_nodes = NodeSet()
         self.max_depth = max_depth
         self.construction_method = construction_method
+        self._compiled = None
+        self._compiled_batch = None
+        self._key = None
+        self._owners = None
         self.root_node = self.construct_tree(max_depth, max_const,
                                             function_ratio, variable_ratio,
                                             functions, variables)
@@ -34,7 +110,287 @@ class Tree:
         """
         Predicts an output for the given inputs.
         """
-        return self.root_node.calc(variables)
+        return self.compile()(variables)
+
+
+    def compile(self, batch=False):
+        """
+        Returns the tree compiled to a Python function taking the input features
+        as parameter. The function is generated once and cached until the
+        tree is modified (see invalidate).
+        :param batch:   If True, returns a function that can also be called with
+                        feature columns (NumPy arrays)
+        """
+        if batch:
+            if self._compiled_batch is None:
+                self._compiled_batch = compile_tree(self.root_node, scalar=False)
+            return self._compiled_batch
+        if self._compiled is None:
+            self._compiled = compile_tree(self.root_node)
+        return self._compiled
+
+
+    def invalidate(self, node=None):
+        """
+        Discards the cached data derived from the structure of the tree. Must be
+        called each time the nodes of the tree are modified.
+        :param node:    If set, the modified node: the outputs cached by this
+                        node and its ancestors are discarded (see
+                        predict_columns)
+        """
+        self._compiled = None
+        self._compiled_batch = None
+        self._key = None
+        while node is not None:
+            node.output = None
+            node = node.prev
+
+
+    def clear_outputs(self):
+        """
+        Discards the outputs cached by the function nodes (see
+        predict_columns), for example once the training data is not used
+        anymore.
+        """
+        for node in self.function_nodes:
+            node.output = None
+
+
+    def copy(self):
+        """
+        Returns a copy of the tree that shares its nodes with this tree. The nodes
+        are only duplicated when one of the trees sharing them calls
+        ensure_writable before being modified (copy on write).
+        """
+        if self._owners is None:
+            self._owners = [1]
+        self._owners[0] += 1
+        tree = type(self).__new__(type(self))
+        tree.__dict__.update(self.__dict__)
+        return tree
+
+
+    def ensure_writable(self):
+        """
+        Gives this tree its own nodes if they are shared with copies of the tree.
+        Must be called before modifying the nodes of the tree.
+        """
+        if self._owners is None:
+            return
+        self._owners[0] -= 1
+        shared = self._owners[0] > 0
+        self._owners = None
+        if not shared:
+            return
+        clones = {}
+        stack = [(self.root_node, None, True)]
+        while stack:
+            node, parent, left = stack.pop()
+            new_node = Node(node.value, parent)
+            new_node.output = node.output
+            clones[node] = new_node
+            if parent is None:
+                self.root_node = new_node
+            elif left:
+                parent.next_left = new_node
+            else:
+                parent.next_right = new_node
+            if node.next_left is not None:
+                stack.append((node.next_right, new_node, False))
+                stack.append((node.next_left, new_node, True))
+        # The clones keep the order of the nodes in the sets, so the nodes
+        # picked randomly do not depend on whether the tree was shared
+        function_nodes = self.function_nodes
+        value_nodes = self.value_nodes
+        self.function_nodes = NodeSet()
+        self.value_nodes = NodeSet()
+        for node in function_nodes:
+            self.function_nodes.add(clones[node])
+        for node in value_nodes:
+            self.value_nodes.add(clones[node])
+
+
+    def __deepcopy__(self, memo):
+        tree = self.copy()
+        tree.ensure_writable()
+        return tree
+
+
+    def structural_key(self):
+        """
+        Returns a hashable key identifying the structure of the tree: two trees
+        have the same key if and only if they hold the same values at the same
+        positions. The key is cached until the tree is modified.
+        """
+        if self._key is None:
+            self._key = tuple(self.prefix())
+        return self._key
+
+
+    def structural_hash(self):
+        """
+        Returns a hash of the structure of the tree (see structural_key).
+        """
+        return hash(self.structural_key())
+
+
+    def predict_batch(self, features):
+        """
+        Predicts the outputs for a whole set of inputs at once. Each node is
+        evaluated a single time over entire feature columns.
+        :param features:    Inputs for prediction (array-like / matrix object of
+                            shape [n_samples, n_features])
+        """
+        return self.predict_columns(to_columns(features))
+
+
+    def predict_columns(self, columns, cache=False):
+        """
+        Predicts the outputs for inputs already converted with to_columns.
+        :param columns: NumPy array of shape [n_features, n_samples]
+        :param cache:   If True, each function node keeps its output for these
+                        columns, and the nodes whose output is already known
+                        are not evaluated again. The outputs of a node and of
+                        its ancestors must be discarded with invalidate when
+                        the node is modified
+        """
+        if cache:
+            output = self.evaluate_cached(columns)
+        else:
+            output = self.compile(batch=True)(columns)
+        if np.ndim(output) == 0:
+            return np.full(columns.shape[1], output, dtype=float)
+        return np.asarray(output, dtype=float)
+
+
+    def evaluate_cached(self, columns):
+        """
+        Computes the output of the tree on feature columns, reusing and storing
+        the outputs cached in the function nodes (see predict_columns).
+        :param columns: NumPy array of shape [n_features, n_samples]
+        """
+        outputs = {}
+        stack = [(self.root_node, False)]
+        while stack:
+            node, visited = stack.pop()
+            if node.output is not None and node.output[0] is columns:
+                outputs[node] = node.output[1]
+            elif isinstance(node.value, str):
+                outputs[node] = columns[int(node.value)]
+            elif isinstance(node.value, numbers.Number):
+                outputs[node] = node.value
+            elif not visited:
+                stack.append((node, True))
+                stack.append((node.next_right, False))
+                stack.append((node.next_left, False))
+            else:
+                outputs[node] = node.value(outputs.pop(node.next_left),
+                                            outputs.pop(node.next_right))
+                node.output = (columns, outputs[node])
+        return outputs[self.root_node]
+
+
+    @classmethod
+    def from_prefix(cls, values, construction_method='grow'):
+        """
+        Builds a tree from the values of its nodes listed in prefix order (see
+        prefix).
+        :param values:              The values of the nodes
+        :param construction_method: The construction method to record
+        """
+        tree = cls.__new__(cls)
+        tree.function_nodes = NodeSet()
+        tree.value_nodes = NodeSet()
+        tree.construction_method = construction_method
+        tree._compiled = None
+        tree._compiled_batch = None
+        tree._key = None
+        tree._owners = None
+        tree.max_depth = 0
+        tree.root_node = None
+        parents = []
+        for value in values:
+            if tree.root_node is not None and not parents:
+                raise ValueError('Invalid prefix: too many values')
+            parent = parents[-1][0] if parents else None
+            node = Node(value, parent)
+            tree.register_node(node)
+            if parent is None:
+                depth = 1
+                tree.root_node = node
+            else:
+                depth = parents[-1][1] + 1
+                if parent.next_left is None:
+                    parent.next_left = node
+                else:
+                    parent.next_right = node
+                    parents.pop()
+            tree.max_depth = max(tree.max_depth, depth)
+            if hasattr(value, '__call__'):
+                parents.append((node, depth))
+        if parents or tree.root_node is None:
+            raise ValueError('Invalid prefix: missing values')
+        return tree
+
+
+    def prefix(self):
+        """
+        Returns the values of the nodes of the tree in prefix order (each
+        function is followed by its left and right subtrees).
+        """
+        values = []
+        stack = [self.root_node]
+        while stack:
+            node = stack.pop()
+            values.append(node.value)
+            if node.next_left is not None:
+                stack.append(node.next_right)
+                stack.append(node.next_left)
+        return values
+
+
+    def constants(self):
+        """
+        Returns the values of the constant nodes of the tree in prefix order.
+        """
+        return [value for value in self.prefix() if is_constant(value)]
+
+
+    def set_constants(self, values):
+        """
+        Replaces the values of the constant nodes of the tree.
+        :param values:  The new values, in prefix order (see constants)
+        """
+        self.ensure_writable()
+        values = iter(values)
+        stack = [self.root_node]
+        while stack:
+            node = stack.pop()
+            if node.next_left is not None:
+                stack.append(node.next_right)
+                stack.append(node.next_left)
+            elif is_constant(node.value):
+                node.value = next(values)
+                self.invalidate(node)
+
+
+    def simplify(self):
+        """
+        Folds the subtrees without variables and applies the algebraic
+        identities of the known operators (see simplify_prefix). The nodes of
+        the tree are replaced only if the tree becomes smaller.
+        """
+        values = simplify_prefix(self.prefix())
+        if len(values) == len(self):
+            return
+        tree = Tree.from_prefix(values, self.construction_method)
+        if self._owners is not None:
+            self._owners[0] -= 1
+            self._owners = None
+        self.function_nodes = tree.function_nodes
+        self.value_nodes = tree.value_nodes
+        self.root_node = tree.root_node
+        self.invalidate()
 
 
     def construct_tree(self, depth, max_const, function_ratio,
@@ -46,7 +402,7 @@ class Tree:
             val = self.choose_node_values_only(variable_ratio, max_const,
                                                 variables)
             node = Node(val, prev_node)
-            self.nodes.append(node)
+            self.register_node(node)
             return node
 
         if self.construction_method == 'grow':
@@ -55,9 +411,9 @@ class Tree:
         else:
             val = self.choose_node_functions_only(functions)
         current_node = Node(val, prev_node)
-        self.nodes.append(current_node)
+        self.register_node(current_node)
 
-        if isinstance(val, int) or isinstance(val, str):
+        if isinstance(val, (numbers.Number, str)):
             return current_node
 
         next_left = self.construct_tree(depth - 1, max_const, function_ratio,
@@ -106,23 +462,35 @@ class Tree:
         return random.choice(functions)
 
 
+    @property
+    def nodes(self):
+        """
+        The list of the nodes of the tree.
+        """
+        return self.function_nodes.items + self.value_nodes.items
+
+
     def pick_random_node(self, content=None):
         """
-        Returns a node randomly chosen from the nodes list.
+        Returns a node randomly chosen in the tree, excluding the root node.
         :param content: The type of content held in the node. Can be set to
                         None if any node can be chosen, 'function' is the
                         node must contain a function and 'value' for a const
                         or a variable
         """
-        node = random.choice(self.nodes)
-        if node == self.root_node:
-            return self.pick_random_node(content)
-        if content is None or \
-        (content == 'function' and hasattr(node.value, '__call__')) or \
-        (content == 'value' and
-            (isinstance(node.value, str) or isinstance(node.value, int))):
-            return node
-        return self.pick_random_node(content)
+        sets = []
+        if content in (None, 'function'):
+            sets.append(self.function_nodes)
+        if content in (None, 'value'):
+            sets.append(self.value_nodes)
+        sizes = [len(nodes) - (self.root_node in nodes) for nodes in sets]
+        if sum(sizes) == 0:
+            raise ValueError('No node to pick in the tree')
+        index = random.randrange(sum(sizes))
+        for nodes, size in zip(sets, sizes):
+            if index < size:
+                return nodes.get(index, exclude=self.root_node)
+            index -= size
 
 
     def has_function_node(self):
@@ -130,10 +498,48 @@ class Tree:
         Returns True if the tree contains at least one node with a function
         and this node is not the root node.
         """
-        for node in self.nodes:
-            if node != self.root_node and hasattr(node.value, '__call__'):
-                return True
-        return False
+        return len(self.function_nodes) > (self.root_node in self.function_nodes)
+
+
+    def node_depth(self, node):
+        """
+        Returns the depth of a node (1 for the root node).
+        """
+        depth = 1
+        while node.prev is not None:
+            node = node.prev
+            depth += 1
+        return depth
+
+
+    def subtree_size(self, node):
+        """
+        Returns the number of nodes of the subtree starting at a node.
+        """
+        size = 0
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node is None: continue
+            size += 1
+            stack.append(node.next_left)
+            stack.append(node.next_right)
+        return size
+
+
+    def subtree_height(self, node):
+        """
+        Returns the depth of the subtree starting at a node.
+        """
+        height = 0
+        stack = [(node, 1)]
+        while stack:
+            node, depth = stack.pop()
+            if node is None: continue
+            height = max(height, depth)
+            stack.append((node.next_left, depth + 1))
+            stack.append((node.next_right, depth + 1))
+        return height
 
 
     def remove_random_node(self):
@@ -147,22 +553,58 @@ class Tree:
 
     def remove_children_nodes(self, node):
         """
-        Removes all the subnodes of a certain node from the tree.
+        Removes a node and all its subnodes from the tree.
         """
-        if node is None: return
-        self.nodes.remove(node)
-        self.remove_children_nodes(node.next_left)
-        self.remove_children_nodes(node.next_right)
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node is None: continue
+            if hasattr(node.value, '__call__'):
+                self.function_nodes.remove(node)
+            else:
+                self.value_nodes.remove(node)
+            stack.append(node.next_left)
+            stack.append(node.next_right)
 
 
     def add_node(self, node):
         """
         Adds a node and all it's children in the tree.
         """
-        if node is None: return
-        self.nodes.append(node)
-        self.add_node(node.next_left)
-        self.add_node(node.next_right)
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node is None: continue
+            self.register_node(node)
+            stack.append(node.next_left)
+            stack.append(node.next_right)
+
+
+    def register_node(self, node):
+        """
+        Adds a single node (without its children) in the tree.
+        """
+        if hasattr(node.value, '__call__'):
+            self.function_nodes.add(node)
+        else:
+            self.value_nodes.add(node)
+
+
+    def __len__(self):
+        return len(self.function_nodes) + len(self.value_nodes)
+
+
+    def __getstate__(self):
+        return {'prefix':               self.prefix(),
+                'max_depth':            self.max_depth,
+                'construction_method':  self.construction_method}
+
+
+    def __setstate__(self, state):
+        tree = type(self).from_prefix(state['prefix'],
+                                    state['construction_method'])
+        self.__dict__.update(tree.__dict__)
+        self.max_depth = state['max_depth']
 
 
     def __repr__(self):
@@ -174,7 +616,7 @@ class Tree:
             return ''
         if isinstance(node.value, str):
             return 'f[{}]\n'.format(node.value)
-        elif isinstance(node.value, int):
+        elif isinstance(node.value, numbers.Number):
             return '{}\n'.format(node.value)
         else:
             repr = '{}\n'.format(node.value)
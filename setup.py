@@ -39,5 +39,6 @@ setup(
 
     keywords='genetic evolution intelligence data learning',
 
-    packages=find_packages(exclude=['contrib','docs','tests','example.py'])
+    packages=find_packages(exclude=['contrib','docs','tests','benchmarks',
+                                    'benchmarks.*','example.py'])
 )